@@ -1,17 +1,48 @@
 import os
 import json
 import socket
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify, send_file
+import time
+import hashlib
+import threading
+import io
+import tempfile
+import zipfile
+import gzip
+import glob
+import re
+import stat
+import mimetypes
+import textwrap
+import click
+import secrets
+import sqlite3
+from blinker import Namespace
+from collections import deque, Counter, OrderedDict
+from types import SimpleNamespace
+from flask import Flask, has_request_context, render_template_string, request, redirect, url_for, session, jsonify, send_file, send_from_directory, make_response, abort, Response, stream_with_context
+from flask.sessions import SessionInterface, SessionMixin
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import safe_join
 from flask_sqlalchemy import SQLAlchemy
-from flask_socketio import SocketIO, emit
-from jinja2 import DictLoader
-from datetime import datetime
+from sqlalchemy import and_, or_, text, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import selectinload
+from flask_socketio import SocketIO, emit, join_room
+from jinja2 import DictLoader, FileSystemBytecodeCache
+from datetime import datetime, timedelta
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Frame, LayoutError
+from reportlab.pdfgen.canvas import Canvas
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from io import BytesIO
+from PIL import Image, ImageOps
+from eventlet import tpool, spawn
+from eventlet.semaphore import Semaphore
+from eventlet.queue import Queue, Empty
+from eventlet.event import Event
+from eventlet.hubs import trampoline
 
 # ==============================================================================
 #  основных настроек (App Configuration)
@@ -24,13 +55,155 @@ app = Flask(__name__)
 # Use environment variables for configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-default-fallback-secret-key-for-dev')
 # Render provides a DATABASE_URL for PostgreSQL. Fallback to SQLite for local dev.
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///foodify.db')
+database_url = os.environ.get('DATABASE_URL', 'sqlite:///foodify.db')
+# Pin bare PostgreSQL URLs to psycopg2 (the installed driver, made green below); SQLAlchemy
+# rejects 'postgres://' and maps 'postgresql://' to psycopg 3.
+if database_url.startswith(('postgres://', 'postgresql://')):
+    database_url = 'postgresql+psycopg2://' + database_url.split('://', 1)[1]
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Largest accepted upload; the whole request is capped slightly above it.
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_BYTES'] + 64 * 1024
+# Food photos are stored as content-hashed JPEG and WebP variants at these widths (plus full size, capped).
+app.config['IMAGE_VARIANT_WIDTHS'] = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',')]
+app.config['IMAGE_MAX_WIDTH'] = int(os.environ.get('IMAGE_MAX_WIDTH', 1600))
+# Optional directory for persisting compiled template bytecode so new workers start warm.
+app.config['TEMPLATE_BYTECODE_DIR'] = os.environ.get('TEMPLATE_BYTECODE_DIR')
+# On-disk cache for rendered bill PDFs (orders never change once placed).
+app.config['BILL_CACHE_DIR'] = os.environ.get('BILL_CACHE_DIR', os.path.join(app.instance_path, 'bills'))
+app.config['BILL_CACHE_MAX_BYTES'] = int(os.environ.get('BILL_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+# Maximum number of bills rendered at once in the native thread pool, per worker.
+app.config['BILL_RENDER_CONCURRENCY'] = int(os.environ.get('BILL_RENDER_CONCURRENCY', 2))
+# Largest selection exported as one PDF. The whole document is built before it is sent,
+# with every page held in memory, so bigger selections must use the ZIP export.
+app.config['BILL_EXPORT_PDF_MAX_ORDERS'] = int(os.environ.get('BILL_EXPORT_PDF_MAX_ORDERS', 200))
+# Automatic receipt printing: where to spool receipts (dir:/path, pipe:/path, unix:/path or
+# tcp:host:port; unset disables it), in which format, and how often to retry a failed write.
+app.config['PRINT_SPOOL_TARGET'] = os.environ.get('PRINT_SPOOL_TARGET')
+app.config['PRINT_SPOOL_FORMAT'] = os.environ.get('PRINT_SPOOL_FORMAT', 'escpos')
+app.config['PRINT_SPOOL_RETRIES'] = int(os.environ.get('PRINT_SPOOL_RETRIES', 3))
+app.config['PRINT_SPOOL_RETRY_DELAY'] = float(os.environ.get('PRINT_SPOOL_RETRY_DELAY', 1.0))
+# Number of orders per page in the admin orders feed.
+app.config['ADMIN_ORDERS_PAGE_SIZE'] = int(os.environ.get('ADMIN_ORDERS_PAGE_SIZE', 20))
+# New-order pushes arriving within this window are sent to admins as one batch (0 disables batching).
+app.config['NEW_ORDER_BATCH_WINDOW_MS'] = int(os.environ.get('NEW_ORDER_BATCH_WINDOW_MS', 250))
+# How long browsers and CDNs may reuse an uploaded image before revalidating.
+app.config['UPLOADS_MAX_AGE'] = int(os.environ.get('UPLOADS_MAX_AGE', 86400))
+# Hand upload bodies to a fronting proxy: '' (serve from Python), 'x-accel' (nginx) or 'x-sendfile'.
+app.config['UPLOADS_SENDFILE_MODE'] = os.environ.get('UPLOADS_SENDFILE_MODE', '')
+# nginx 'internal' location that maps onto the upload folder, used in x-accel mode.
+app.config['UPLOADS_ACCEL_PREFIX'] = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+# In-memory LRU of small uploaded files (0 disables it).
+app.config['UPLOADS_MEMORY_CACHE_BYTES'] = int(os.environ.get('UPLOADS_MEMORY_CACHE_BYTES', 32 * 1024 * 1024))
+app.config['UPLOADS_MEMORY_CACHE_MAX_FILE'] = int(os.environ.get('UPLOADS_MEMORY_CACHE_MAX_FILE', 256 * 1024))
+# SQLite tuning applied to every connection (used when DATABASE_URL is unset).
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+# Window for grouping concurrent order inserts into one commit (0 commits each order on its own).
+app.config['ORDER_GROUP_COMMIT_MS'] = int(os.environ.get('ORDER_GROUP_COMMIT_MS', 0))
+app.config['ORDER_GROUP_COMMIT_MAX'] = int(os.environ.get('ORDER_GROUP_COMMIT_MAX', 50))
+# Local store of checkout idempotency keys, so resubmitted checkout forms don't create duplicate orders.
+app.config['IDEMPOTENCY_STORE_PATH'] = os.environ.get('IDEMPOTENCY_STORE_PATH', os.path.join(app.instance_path, 'idempotency.db'))
+app.config['IDEMPOTENCY_TTL_SECONDS'] = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 3600))
+# Where session data (cart, admin login) lives: 'sqlite' (shared by the workers on a host),
+# 'memory' (single worker, LRU-evicted) or 'cookie' (Flask's signed cookie).
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'sqlite')
+app.config['SESSION_STORE_PATH'] = os.environ.get('SESSION_STORE_PATH', os.path.join(app.instance_path, 'sessions.db'))
+app.config['SESSION_MEMORY_MAX_ENTRIES'] = int(os.environ.get('SESSION_MEMORY_MAX_ENTRIES', 10000))
+# Server-side lifetime of browser-session (non-permanent) sessions, renewed while in use.
+app.config['SESSION_STORE_TTL_SECONDS'] = int(os.environ.get('SESSION_STORE_TTL_SECONDS', 24 * 3600))
+# Orders younger than this are left out of the sales rollups until they settle, so orders
+# committed slightly out of id order are never skipped. With the order queue, rollups instead
+# wait for the queue writers themselves (see OrderIngestQueue.min_unwritten_id).
+app.config['ROLLUP_SETTLE_SECONDS'] = int(os.environ.get('ROLLUP_SETTLE_SECONDS', 30))
+# Orders older than ARCHIVE_AFTER_DAYS are moved out of the database into compressed daily files.
+# Those files become the only copy, so ARCHIVE_DIR must be set explicitly to persistent storage
+# (not the instance folder or an ephemeral container disk). Archiving is disabled while it is unset.
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR')
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+# Durable local ingestion queue for checkouts (SQLite file path; unset writes orders synchronously).
+app.config['ORDER_QUEUE_PATH'] = os.environ.get('ORDER_QUEUE_PATH')
+app.config['ORDER_QUEUE_MAX_DEPTH'] = int(os.environ.get('ORDER_QUEUE_MAX_DEPTH', 500))
+app.config['ORDER_QUEUE_WAIT_SECONDS'] = float(os.environ.get('ORDER_QUEUE_WAIT_SECONDS', 5))
+app.config['ORDER_QUEUE_BATCH_SIZE'] = int(os.environ.get('ORDER_QUEUE_BATCH_SIZE', 100))
+app.config['ORDER_QUEUE_POLL_MS'] = int(os.environ.get('ORDER_QUEUE_POLL_MS', 100))
+
+# --- Database connection pooling ---
+def database_engine_options(uri):
+    """Builds SQLAlchemy engine options from DB_POOL_* environment variables."""
+    options = {
+        # Checks connections before use, so ones dropped by the server are replaced transparently
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if not uri.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        )
+    return options
+
+def make_psycopg2_green():
+    """Makes psycopg2 wait for the server on the eventlet hub instead of blocking it.
+
+    This is the wait callback psycogreen installs: queries run in psycopg2's async
+    mode and every wait yields to other green threads. Returns False if psycopg2
+    is not installed.
+    """
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+
+    def eventlet_wait_callback(conn, timeout=-1):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                trampoline(conn.fileno(), read=True)
+            elif state == extensions.POLL_WRITE:
+                trampoline(conn.fileno(), write=True)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(eventlet_wait_callback)
+    return True
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres') and os.environ.get('GREEN_DB_DRIVER', '1') != '0':
+    make_psycopg2_green()
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Sets journaling, durability, lock waiting and mmap on each new SQLite connection.
+
+    WAL lets readers carry on while an order is being written, and the busy timeout
+    makes concurrent checkouts wait for the write lock instead of failing with
+    "database is locked".
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}")
+    cursor.close()
 
 db = SQLAlchemy(app)
 socketio = SocketIO(app, async_mode='eventlet')
 
+# Sent after place_order() commits a new order, with order_id=<id>.
+app_signals = Namespace()
+order_placed = app_signals.signal('order-placed')
+
 # Admin credentials from environment variables
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'SUBHAJIT')
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '8167')
@@ -46,9 +219,11 @@ class Food(db.Model):
     image_url = db.Column(db.String(255), nullable=False)
 
 class Order(db.Model):
+    # Admin listings page through orders by (timestamp, id)
+    __table_args__ = (db.Index('ix_order_timestamp_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(100), nullable=False)
-    customer_phone = db.Column(db.String(20), nullable=False)
+    customer_phone = db.Column(db.String(20), nullable=False, index=True)
     customer_address = db.Column(db.String(255), nullable=False)
     total_bill = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -56,7 +231,7 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     food_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -65,6 +240,109 @@ class AppSetting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.String(255), nullable=True)
 
+# --- Sales rollups (maintained from orders, see compact_rollups) ---
+class SalesDaily(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class SalesHourly(db.Model):
+    hour = db.Column(db.DateTime, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class SalesByFood(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    food_name = db.Column(db.String(100), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class RollupState(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ==============================================================================
+# Кэширование (Caching)
+# ==============================================================================
+
+class SharedVersion:
+    """A version counter kept in a small file so every worker on the host sees bumps.
+
+    Reading costs one os.stat(); the file is only re-read when it has changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stat_key = None
+        self._value = 0
+
+    def get(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._stat_key, self._value = None, 0
+            return 0
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key != self._stat_key:
+            try:
+                with open(self.path) as f:
+                    self._value = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                self._value = 0
+            self._stat_key = stat_key
+        return self._value
+
+    def bump(self):
+        # Nanosecond timestamps keep concurrent bumps from different workers distinct
+        # without needing a cross-process lock.
+        value = max(self.get() + 1, time.time_ns())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(value))
+        os.replace(tmp_path, self.path)
+        return value
+
+class SettingsCache:
+    """Process-local copy of all AppSetting rows, reloaded when the shared version changes."""
+
+    def __init__(self, version):
+        self.version = version
+        self._values = None
+        self._loaded_version = None
+
+    def all(self):
+        current = self.version.get()
+        if self._values is None or current != self._loaded_version:
+            # Read the version before querying so a bump during the load triggers a reload.
+            self._values = {setting.key: setting.value for setting in AppSetting.query.all()}
+            self._loaded_version = current
+        return self._values
+
+    def get(self, key, default=None):
+        value = self.all().get(key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        setting = db.session.get(AppSetting, key)
+        if setting:
+            setting.value = value
+        else:
+            db.session.add(AppSetting(key=key, value=value))
+        db.session.commit()
+        self.version.bump()
+        self._values = None
+
+settings_version = SharedVersion(os.path.join(app.instance_path, 'settings.version'))
+settings_cache = SettingsCache(settings_version)
+
 # ==============================================================================
 # HTML и CSS шаблоны (HTML & CSS Templates)
 # ==============================================================================
@@ -168,11 +446,9 @@ BASE_TEMPLATE = """
             <!-- Cart link visible on mobile outside the menu -->
             <a class="nav-link d-lg-none me-3 position-relative" href="{{ url_for('cart_page') }}">
                 Cart 
-                {% if session.get('cart') %}
-                <span class="position-absolute top-0 start-100 translate-middle cart-badge">
-                    {{ session.get('cart')|length }}
+                <span class="position-absolute top-0 start-100 translate-middle cart-badge cart-count{% if not session.get('cart') %} d-none{% endif %}">
+                    {{ session.get('cart', {})|length }}
                 </span>
-                {% endif %}
             </a>
 
             <button class="navbar-toggler" type="button" data-bs-toggle="collapse" data-bs-target="#navbarNav">
@@ -186,11 +462,9 @@ BASE_TEMPLATE = """
                     <li class="nav-item d-none d-lg-block">
                         <a class="nav-link position-relative" href="{{ url_for('cart_page') }}">
                             Cart
-                            {% if session.get('cart') %}
-                            <span class="position-absolute top-0 start-100 translate-middle cart-badge">
-                                {{ session.get('cart')|length }}
+                            <span class="position-absolute top-0 start-100 translate-middle cart-badge cart-count{% if not session.get('cart') %} d-none{% endif %}">
+                                {{ session.get('cart', {})|length }}
                             </span>
-                            {% endif %}
                         </a>
                     </li>
                     <li class="nav-item"><a class="nav-link" href="{{ url_for('admin_login') }}">Admin</a></li>
@@ -204,16 +478,68 @@ BASE_TEMPLATE = """
     </div>
 
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js"></script>
+    <script>
+        // Cart API helpers shared by the home and cart pages (see /api/cart)
+        function cartRequest(method, url, body) {
+            return fetch(url, {
+                method: method,
+                headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+                body: body ? JSON.stringify(body) : undefined
+            }).then(response => response.ok ? response.json() : Promise.reject(response));
+        }
+        function updateCartBadges(count) {
+            document.querySelectorAll('.cart-count').forEach(badge => {
+                badge.textContent = count;
+                badge.classList.toggle('d-none', count === 0);
+            });
+        }
+    </script>
     {% block scripts %}{% endblock %}
 </body>
 </html>
 """
 
 # --- Homepage Template ---
+# The menu body is pre-rendered once per menu version (see MenuCache), so the
+# page itself only wraps the cached HTML in the base layout.
 HOME_TEMPLATE = """
 {% extends "base.html" %}
 {% block title %}Home - FOODIFY{% endblock %}
-{% block content %}
+{% block content %}{{ menu_html|safe }}{% endblock %}
+{% block scripts %}
+<script>
+    // Add to cart without leaving the page; the form post stays as the fallback
+    document.addEventListener('submit', event => {
+        const form = event.target.closest('form.add-to-cart-form');
+        if (!form || !window.fetch) return;
+        event.preventDefault();
+        const button = form.querySelector('button[type="submit"]');
+        const quantity = parseInt(form.elements.quantity.value, 10) || 1;
+        button.disabled = true;
+        cartRequest('POST', '{{ url_for('api_cart_add') }}', {food_id: parseInt(form.dataset.foodId, 10), quantity: quantity})
+            .then(cart => {
+                updateCartBadges(cart.count);
+                button.textContent = 'Added ✓';
+                setTimeout(() => { button.textContent = 'Add to Cart'; button.disabled = false; }, 1200);
+            })
+            .catch(() => form.submit());
+    });
+</script>
+{% endblock %}
+"""
+
+# --- Homepage Menu Body (carousel and food cards) ---
+HOME_MENU_FRAGMENT = """
+    {% macro food_image(food, css_class, style, sizes, lazy=False) -%}
+    {% if food.srcset %}
+    <picture>
+        <source type="image/webp" srcset="{{ food.webp_srcset }}" sizes="{{ sizes }}">
+        <img src="{{ food.image_url }}" srcset="{{ food.srcset }}" sizes="{{ sizes }}" class="{{ css_class }}" alt="{{ food.name }}" style="{{ style }}"{% if lazy %} loading="lazy"{% endif %}>
+    </picture>
+    {% else %}
+    <img src="{{ food.image_url }}" class="{{ css_class }}" alt="{{ food.name }}" style="{{ style }}"{% if lazy %} loading="lazy"{% endif %}>
+    {% endif %}
+{%- endmacro %}
     <!-- Carousel Banner -->
     {% if foods %}
     <div id="foodCarousel" class="carousel slide mb-5" data-bs-ride="carousel">
@@ -225,7 +551,7 @@ HOME_TEMPLATE = """
         <div class="carousel-inner" style="border-radius: 15px; max-height: 400px;">
             {% for food in foods %}
             <div class="carousel-item {{ 'active' if loop.first }}">
-                <img src="{{ food.image_url }}" class="d-block w-100" alt="{{ food.name }}" style="object-fit: cover; height: 400px;">
+                {{ food_image(food, 'd-block w-100', 'object-fit: cover; height: 400px;', '100vw', lazy=not loop.first) }}
                 <div class="carousel-caption d-none d-md-block p-2 rounded">
                     <h5>{{ food.name }}</h5>
                     <p>Only Rs {{ "%.2f"|format(food.price) }}</p>
@@ -251,11 +577,11 @@ HOME_TEMPLATE = """
         {% for food in foods %}
         <div class="col-md-4 mb-4">
             <div class="card h-100">
-                <img src="{{ food.image_url }}" class="card-img-top" alt="{{ food.name }}" style="height: 200px; object-fit: cover; border-top-left-radius: 13px; border-top-right-radius: 13px;">
+                {{ food_image(food, 'card-img-top', 'height: 200px; object-fit: cover; border-top-left-radius: 13px; border-top-right-radius: 13px;', '(min-width: 768px) 33vw, 100vw', lazy=True) }}
                 <div class="card-body d-flex flex-column">
                     <h5 class="card-title">{{ food.name }}</h5>
                     <p class="card-text">Price: Rs {{ "%.2f"|format(food.price) }}</p>
-                    <form action="{{ url_for('add_to_cart', food_id=food.id) }}" method="post" class="mt-auto">
+                    <form action="{{ url_for('add_to_cart', food_id=food.id) }}" method="post" class="mt-auto add-to-cart-form" data-food-id="{{ food.id }}">
                         <div class="input-group">
                             <input type="number" name="quantity" class="form-control" value="1" min="1">
                             <button type="submit" class="btn btn-primary">Add to Cart</button>
@@ -268,7 +594,6 @@ HOME_TEMPLATE = """
         <p>OUR DELIVERY SERVICE TIME 6:00PM TO 10:00PM.</p>
         {% endfor %}
     </div>
-{% endblock %}
 """
 
 # --- Order Page Template ---
@@ -281,6 +606,7 @@ CART_TEMPLATE = """
     <div class="alert alert-danger">{{ error }}</div>
 {% endif %}
 <form id="checkoutForm" method="post" action="{{ url_for('place_order') }}">
+    <input type="hidden" name="idempotency_key" value="{{ idempotency_key }}">
     <div class="row">
         <!-- Cart Items -->
         <div class="col-md-6">
@@ -288,25 +614,31 @@ CART_TEMPLATE = """
             {% if cart_items %}
                 <ul class="list-group mb-3">
                     {% for item in cart_items %}
-                    <li class="list-group-item d-flex justify-content-between lh-sm">
+                    <li class="list-group-item d-flex justify-content-between lh-sm cart-line" data-food-id="{{ item.food.id }}">
                         <div>
                             <h6 class="my-0">{{ item.food.name }}</h6>
-                            <small class="text-muted">Quantity: {{ item.quantity }}</small>
+                            <small class="text-muted">Quantity: <span class="line-quantity">{{ item.quantity }}</span></small>
+                            <!-- Shown by the script below; without JavaScript the cart is read-only -->
+                            <div class="btn-group btn-group-sm mt-1 d-none cart-line-controls">
+                                <button type="button" class="btn btn-outline-secondary" data-cart-step="-1">−</button>
+                                <button type="button" class="btn btn-outline-secondary" data-cart-step="1">+</button>
+                                <button type="button" class="btn btn-outline-danger" data-cart-remove>Remove</button>
+                            </div>
                         </div>
-                        <span class="text-muted">Rs {{ "%.2f"|format(item.subtotal) }}</span>
+                        <span class="text-muted">Rs <span class="line-subtotal">{{ "%.2f"|format(item.subtotal) }}</span></span>
                     </li>
                     {% endfor %}
                     <li class="list-group-item d-flex justify-content-between">
                         <span>Subtotal</span>
-                        <span>Rs {{ "%.2f"|format(subtotal) }}</span>
+                        <span>Rs <span id="cart-subtotal">{{ "%.2f"|format(subtotal) }}</span></span>
                     </li>
                     <li class="list-group-item d-flex justify-content-between">
                         <span>Delivery Charge</span>
-                        <span>Rs {{ "%.2f"|format(delivery_charge) }}</span>
+                        <span>Rs <span id="cart-delivery">{{ "%.2f"|format(delivery_charge) }}</span></span>
                     </li>
                     <li class="list-group-item d-flex justify-content-between bg-light">
                         <span class="fw-bold text-orange">Total (INR)</span>
-                        <strong class="fw-bold text-orange">Rs {{ "%.2f"|format(total_bill) }}</strong>
+                        <strong class="fw-bold text-orange">Rs <span id="cart-total">{{ "%.2f"|format(total_bill) }}</span></strong>
                     </li>
                 </ul>
                 <a href="{{ url_for('clear_cart') }}" class="btn btn-danger">Clear Cart</a>
@@ -350,8 +682,47 @@ CART_TEMPLATE = """
 {% endblock %}
 {% block scripts %}
 <script>
+    // Quantity changes go through the cart API and only update the summary in place
+    function applyCart(cart) {
+        if (cart.count === 0) {
+            window.location.reload();
+            return;
+        }
+        updateCartBadges(cart.count);
+        const lines = new Map(cart.items.map(item => [String(item.food_id), item]));
+        document.querySelectorAll('.cart-line').forEach(li => {
+            const item = lines.get(li.dataset.foodId);
+            if (!item) {
+                li.remove();
+                return;
+            }
+            li.querySelector('.line-quantity').textContent = item.quantity;
+            li.querySelector('.line-subtotal').textContent = item.subtotal.toFixed(2);
+        });
+        document.getElementById('cart-subtotal').textContent = cart.subtotal.toFixed(2);
+        document.getElementById('cart-delivery').textContent = cart.delivery_charge.toFixed(2);
+        document.getElementById('cart-total').textContent = cart.total.toFixed(2);
+    }
+    if (window.fetch) {
+        document.querySelectorAll('.cart-line-controls').forEach(controls => controls.classList.remove('d-none'));
+        document.addEventListener('click', event => {
+            const button = event.target.closest('[data-cart-step], [data-cart-remove]');
+            if (!button) return;
+            const li = button.closest('.cart-line');
+            const url = '{{ url_for('api_cart_item', food_id=0) }}'.replace(/0$/, li.dataset.foodId);
+            let request;
+            if (button.hasAttribute('data-cart-remove')) {
+                request = cartRequest('DELETE', url);
+            } else {
+                const quantity = parseInt(li.querySelector('.line-quantity').textContent, 10) + parseInt(button.dataset.cartStep, 10);
+                request = cartRequest('PUT', url, {quantity: quantity});
+            }
+            request.then(applyCart).catch(() => window.location.reload());
+        });
+    }
+
     // Geolocation
-    document.getElementById('getLocationBtn').addEventListener('click', function() {
+    document.getElementById('getLocationBtn')?.addEventListener('click', function() {
         if (navigator.geolocation) {
             this.textContent = 'Detecting...';
             this.disabled = true;
@@ -416,6 +787,29 @@ ORDER_SUCCESS_TEMPLATE = """
 {% endblock %}
 """
 
+# --- Order Pending Template (order queued, not yet saved) ---
+ORDER_PENDING_TEMPLATE = """
+{% extends "base.html" %}
+{% block title %}Order Received - FOODIFY{% endblock %}
+{% block head_extra %}
+    {% if not failed %}<meta http-equiv="refresh" content="2">{% endif %}
+{% endblock %}
+{% block content %}
+<div class="text-center">
+    {% if failed %}
+    <h1 class="text-orange">Order #{{ order_id }} Needs Attention</h1>
+    <p class="lead">We received your order but could not confirm it automatically.</p>
+    <p>Our team has been alerted and will contact you shortly.</p>
+    {% else %}
+    <h1 class="text-orange">✅ Order Received!</h1>
+    <p class="lead">Your order number is #{{ order_id }}.</p>
+    <p>We are confirming your order. This page will update in a moment.</p>
+    {% endif %}
+    <a href="{{ url_for('index') }}" class="btn btn-primary">Back to Home</a>
+</div>
+{% endblock %}
+"""
+
 # --- Admin Login Template ---
 ADMIN_LOGIN_TEMPLATE = """
 {% extends "base.html" %}
@@ -453,8 +847,33 @@ ADMIN_DASHBOARD_TEMPLATE = """
 {% block content %}
 <div class="d-flex justify-content-between align-items-center mb-4">
     <h1 class="text-orange">Admin Dashboard</h1>
-    <a href="{{ url_for('admin_logout') }}" class="btn btn-danger">Logout</a>
+    <div>
+        <a href="{{ url_for('admin_analytics') }}" class="btn btn-secondary">Analytics</a>
+        <a href="{{ url_for('admin_archive') }}" class="btn btn-secondary">Archive</a>
+        <a href="{{ url_for('admin_logout') }}" class="btn btn-danger">Logout</a>
+    </div>
+</div>
+{% if error %}
+    <div class="alert alert-danger">{{ error }}</div>
+{% endif %}
+
+{% if failed_orders %}
+<div class="alert alert-danger">
+    <strong>{{ failed_orders|length }} queued order(s) could not be saved</strong>: another order was
+    already stored under the same number. Please contact these customers.
+    <ul class="mb-0 mt-2">
+        {% for failed in failed_orders %}
+        <li>
+            #{{ failed.id }} {{ failed.customer_name }} ({{ failed.customer_phone }}),
+            Rs {{ "%.2f"|format(failed.total_bill) }}, placed {{ failed.timestamp.strftime('%Y-%m-%d %H:%M') }}
+            <form action="{{ url_for('admin_dismiss_failed_order', order_id=failed.id) }}" method="post" class="d-inline">
+                <button type="submit" class="btn btn-sm btn-outline-light">Dismiss</button>
+            </form>
+        </li>
+        {% endfor %}
+    </ul>
 </div>
+{% endif %}
 
 <!-- Site Settings Section -->
 <div class="card mb-4">
@@ -486,7 +905,7 @@ ADMIN_DASHBOARD_TEMPLATE = """
 
 <!-- Notification Popup -->
 <div id="notification" class="notification">
-    <strong>New Order!</strong> A new order has been placed.
+    <strong>New Order!</strong> <span class="notification-text">A new order has been placed.</span>
 </div>
 
 <div class="row">
@@ -533,6 +952,25 @@ ADMIN_DASHBOARD_TEMPLATE = """
     <!-- View Orders Section -->
     <div class="col-md-7">
         <h2 class="text-orange">Customer Orders</h2>
+        <form action="{{ url_for('admin_export_bills') }}" method="get" class="row g-2 align-items-end mb-3">
+            <div class="col-sm-3">
+                <label for="export_start" class="form-label">From</label>
+                <input type="date" class="form-control" id="export_start" name="start">
+            </div>
+            <div class="col-sm-3">
+                <label for="export_end" class="form-label">To</label>
+                <input type="date" class="form-control" id="export_end" name="end">
+            </div>
+            <div class="col-sm-3">
+                <select class="form-select" name="format">
+                    <option value="zip">ZIP of bills</option>
+                    <option value="pdf">Single PDF (up to {{ config.BILL_EXPORT_PDF_MAX_ORDERS }} orders)</option>
+                </select>
+            </div>
+            <div class="col-sm-3">
+                <button type="submit" class="btn btn-secondary w-100">Export Bills</button>
+            </div>
+        </form>
         <div id="orders-list">
             {% include 'admin_orders_partial.html' %}
         </div>
@@ -555,36 +993,211 @@ ADMIN_DASHBOARD_TEMPLATE = """
         window.scrollTo(0, 0);
     }
 
+    // "Load older orders" fetches the next page and puts it where the button was
+    document.getElementById('orders-list').addEventListener('click', function(event) {
+        const button = event.target.closest('.load-older-orders');
+        if (!button) return;
+        button.disabled = true;
+        button.textContent = 'Loading...';
+        fetch(button.dataset.url)
+            .then(response => response.text())
+            .then(html => {
+                button.closest('.load-older-wrapper').outerHTML = html;
+            });
+    });
+
     // Socket.IO for live notifications
     document.addEventListener('DOMContentLoaded', function () {
         const socket = io();
         const notification = document.getElementById('notification');
+        const ordersList = document.getElementById('orders-list');
+        const pageSize = {{ config['ADMIN_ORDERS_PAGE_SIZE'] }};
+        // Orders can commit out of id order (queue writers, concurrent checkouts), so
+        // cards are deduplicated by the order ids already on the page, not a high-water mark.
+        function shownIds() {
+            return new Set(Array.from(ordersList.querySelectorAll('.order-card'), card => parseInt(card.dataset.orderId, 10)));
+        }
+        function highestShown() {
+            return Math.max(0, ...shownIds());
+        }
+
+        // Inserts order cards from an HTML fragment newest first, skipping ones already shown
+        function insertOrders(html) {
+            const template = document.createElement('template');
+            template.innerHTML = html;
+            const shown = shownIds();
+            const cards = Array.from(template.content.querySelectorAll('.order-card'))
+                .filter(card => !shown.has(parseInt(card.dataset.orderId, 10)));
+            if (!cards.length) return;
+            const placeholder = document.getElementById('no-orders');
+            if (placeholder) placeholder.remove();
+            cards.forEach(card => {
+                const id = parseInt(card.dataset.orderId, 10);
+                const existing = Array.from(ordersList.querySelectorAll('.order-card'));
+                const next = existing.find(other => parseInt(other.dataset.orderId, 10) < id);
+                if (next) {
+                    next.before(card);
+                } else if (existing.length) {
+                    existing[existing.length - 1].after(card);
+                } else {
+                    ordersList.prepend(card);
+                }
+            });
+        }
+
+        // Fetches orders missed while disconnected; one catch-up at a time
+        let catchingUp = false;
+        let catchUpAgain = false;
+        function catchUp() {
+            if (catchingUp) {
+                catchUpAgain = true;
+                return;
+            }
+            catchingUp = true;
+            fetch("{{ url_for('admin_get_orders') }}?after=" + highestShown())
+                .then(response => response.text())
+                .then(insertOrders)
+                .finally(() => {
+                    catchingUp = false;
+                    if (catchUpAgain) {
+                        catchUpAgain = false;
+                        catchUp();
+                    }
+                });
+        }
+
+        // New orders arrive in batches (oldest first); each batch is one DOM update
+        socket.on('new_orders', function(data) {
+            const shown = shownIds();
+            const orders = data.orders.filter(order => !shown.has(order.seq)); // Skip ones already shown
+            if (!orders.length) return;
+            console.log('New orders received:', orders.map(order => order.msg));
 
-        socket.on('new_order', function(data) {
-            console.log('New order received:', data.msg);
-            
             // Show notification
+            notification.querySelector('.notification-text').textContent = orders.length === 1
+                ? 'A new order has been placed.'
+                : orders.length + ' new orders have been placed.';
             notification.style.display = 'block';
             setTimeout(() => {
                 notification.style.display = 'none';
             }, 5000);
 
-            // Refresh orders list via AJAX
-            fetch("{{ url_for('admin_get_orders') }}")
-                .then(response => response.text())
-                .then(html => {
-                    document.getElementById('orders-list').innerHTML = html;
-                });
+            const highest = highestShown();
+            const newestSeq = orders[orders.length - 1].seq;
+            if (newestSeq - highest > pageSize && !catchingUp) {
+                // Missed too much, reload the newest page
+                catchingUp = true;
+                fetch("{{ url_for('admin_get_orders') }}")
+                    .then(response => response.text())
+                    .then(html => { ordersList.innerHTML = html; })
+                    .finally(() => { catchingUp = false; });
+                return;
+            }
+            // Late commits below the highest shown id are not a gap
+            const contiguous = orders.filter(order => order.seq > highest)
+                .every((order, i) => order.seq === highest + 1 + i);
+            insertOrders(orders.map(order => order.html).join(''));
+            if (!contiguous) {
+                // Gap in the sequence: fetch any orders we missed
+                catchUp();
+            }
         });
     });
 </script>
 {% endblock %}
 """
 
-# --- Admin Orders Partial (for AJAX refresh) ---
-ADMIN_ORDERS_PARTIAL = """
+# --- Admin Analytics Template ---
+ADMIN_ANALYTICS_TEMPLATE = """
+{% extends "base.html" %}
+{% block title %}Analytics - FOODIFY{% endblock %}
+{% block content %}
+<div class="d-flex justify-content-between align-items-center mb-4">
+    <h1 class="text-orange">Sales (last {{ summary.days }} days)</h1>
+    <a href="{{ url_for('admin_dashboard') }}" class="btn btn-secondary">Back to Dashboard</a>
+</div>
+<div class="row mb-4">
+    <div class="col-md-4"><div class="card"><div class="card-body">
+        <h6 class="text-muted">Orders</h6><h3 class="text-orange">{{ summary.totals.order_count }}</h3>
+    </div></div></div>
+    <div class="col-md-4"><div class="card"><div class="card-body">
+        <h6 class="text-muted">Items Sold</h6><h3 class="text-orange">{{ summary.totals.quantity }}</h3>
+    </div></div></div>
+    <div class="col-md-4"><div class="card"><div class="card-body">
+        <h6 class="text-muted">Revenue</h6><h3 class="text-orange">Rs {{ "%.2f"|format(summary.totals.revenue) }}</h3>
+    </div></div></div>
+</div>
+<div class="row">
+    <div class="col-md-6">
+        <h3 class="text-orange">By Day</h3>
+        <table class="table table-sm">
+            <thead><tr><th>Day</th><th>Orders</th><th>Items</th><th>Revenue</th></tr></thead>
+            <tbody>
+            {% for row in summary.daily %}
+                <tr><td>{{ row.day }}</td><td>{{ row.order_count }}</td><td>{{ row.quantity }}</td><td>Rs {{ "%.2f"|format(row.revenue) }}</td></tr>
+            {% else %}
+                <tr><td colspan="4">No sales yet.</td></tr>
+            {% endfor %}
+            </tbody>
+        </table>
+    </div>
+    <div class="col-md-6">
+        <h3 class="text-orange">Top Items</h3>
+        <table class="table table-sm">
+            <thead><tr><th>Item</th><th>Quantity</th><th>Revenue</th></tr></thead>
+            <tbody>
+            {% for row in summary.top_foods %}
+                <tr><td>{{ row.food_name }}</td><td>{{ row.quantity }}</td><td>Rs {{ "%.2f"|format(row.revenue) }}</td></tr>
+            {% else %}
+                <tr><td colspan="3">No sales yet.</td></tr>
+            {% endfor %}
+            </tbody>
+        </table>
+    </div>
+</div>
+{% endblock %}
+"""
+
+# --- Admin Archive Search Template ---
+ADMIN_ARCHIVE_TEMPLATE = """
+{% extends "base.html" %}
+{% block title %}Order Archive - FOODIFY{% endblock %}
+{% block content %}
+<div class="d-flex justify-content-between align-items-center mb-4">
+    <h1 class="text-orange">Order Archive</h1>
+    <a href="{{ url_for('admin_dashboard') }}" class="btn btn-secondary">Back to Dashboard</a>
+</div>
+{% if error %}
+    <div class="alert alert-danger">{{ error }}</div>
+{% endif %}
+<form method="get" class="row g-2 align-items-end mb-4">
+    <div class="col-md-4">
+        <label for="q" class="form-label">Order # or Mobile Number</label>
+        <input type="text" class="form-control" id="q" name="q" value="{{ query.get('q', '') }}">
+    </div>
+    <div class="col-md-3">
+        <label for="start" class="form-label">From</label>
+        <input type="date" class="form-control" id="start" name="start" value="{{ query.get('start', '') }}">
+    </div>
+    <div class="col-md-3">
+        <label for="end" class="form-label">To</label>
+        <input type="date" class="form-control" id="end" name="end" value="{{ query.get('end', '') }}">
+    </div>
+    <div class="col-md-2">
+        <button type="submit" class="btn btn-primary w-100">Search</button>
+    </div>
+</form>
 {% for order in orders %}
-<div class="card mb-3">
+{% include 'admin_order_card.html' %}
+{% else %}
+<p>No archived orders found.</p>
+{% endfor %}
+{% endblock %}
+"""
+
+# --- Admin Order Card (one order, also pushed over Socket.IO) ---
+ADMIN_ORDER_CARD = """
+<div class="card mb-3 order-card" data-order-id="{{ order.id }}">
     <div class="card-header bg-orange text-white d-flex justify-content-between">
         <strong>Order #{{ order.id }}</strong>
         <span>{{ order.timestamp.strftime('%Y-%m-%d %H:%M') }}</span>
@@ -603,14 +1216,26 @@ ADMIN_ORDERS_PARTIAL = """
             <h5 class="m-0 text-orange">Total: Rs {{ "%.2f"|format(order.total_bill) }}</h5>
             <div>
                 <a href="https://www.google.com/maps/search/?api=1&query={{ order.customer_address|urlencode }}" target="_blank" class="btn btn-info">View on Map</a>
-                <a href="{{ url_for('download_bill', order_id=order.id) }}" class="btn btn-primary">Download Bill</a>
+                <a href="{{ order_bill_url(order.id, 'escpos') }}" class="btn btn-secondary">ESC/POS</a>
+                <a href="{{ order_bill_url(order.id) }}" class="btn btn-primary">Download Bill</a>
             </div>
         </div>
     </div>
 </div>
+"""
+
+# --- Admin Orders Partial (for AJAX refresh) ---
+ADMIN_ORDERS_PARTIAL = """
+{% for order in orders %}
+{% include 'admin_order_card.html' %}
 {% else %}
-<p>No orders yet.</p>
+{% if not paged %}<p id="no-orders">No orders yet.</p>{% endif %}
 {% endfor %}
+{% if next_cursor %}
+<div class="text-center mb-3 load-older-wrapper">
+    <button type="button" class="btn btn-secondary load-older-orders" data-url="{{ url_for('admin_get_orders', before=next_cursor) }}">Load older orders</button>
+</div>
+{% endif %}
 """
 
 # ==============================================================================
@@ -621,48 +1246,1004 @@ ADMIN_ORDERS_PARTIAL = """
 TEMPLATES = {
     "base.html": BASE_TEMPLATE,
     "home.html": HOME_TEMPLATE,
+    "home_menu.html": HOME_MENU_FRAGMENT,
     "order.html": CART_TEMPLATE, # Renamed for clarity, used by cart_page
     "order_success.html": ORDER_SUCCESS_TEMPLATE,
+    "order_pending.html": ORDER_PENDING_TEMPLATE,
     "admin_login.html": ADMIN_LOGIN_TEMPLATE,
     "admin_dashboard.html": ADMIN_DASHBOARD_TEMPLATE,
     "admin_orders_partial.html": ADMIN_ORDERS_PARTIAL,
+    "admin_order_card.html": ADMIN_ORDER_CARD,
+    "admin_analytics.html": ADMIN_ANALYTICS_TEMPLATE,
+    "admin_archive.html": ADMIN_ARCHIVE_TEMPLATE,
 }
 
-# --- Helper function to render templates ---
+# --- Template environment (built once per process) ---
+@app.template_global()
+def order_bill_url(order_id, bill_format=None):
+    """URL of an order's bill. Outside a request (the order queue writer announcing an
+    order) url_for() needs SERVER_NAME, so a root-relative URL is built instead."""
+    values = {'order_id': order_id}
+    if bill_format:
+        values['format'] = bill_format
+    if has_request_context():
+        return url_for('download_bill', **values)
+    return app.url_map.bind('', script_name=app.config['APPLICATION_ROOT']).build('download_bill', values)
+
+def create_template_env():
+    """Builds the Jinja environment for TEMPLATES and compiles every template up front."""
+    bytecode_cache = None
+    bytecode_dir = app.config.get('TEMPLATE_BYTECODE_DIR')
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+
+    # The overlay shares Flask's globals (url_for, session, ...) but keeps its own
+    # loader and template cache, so compiled templates survive across requests.
+    env = app.jinja_env.overlay(loader=DictLoader(TEMPLATES), bytecode_cache=bytecode_cache)
+    for name in TEMPLATES:
+        env.get_template(name)
+    return env
+
+template_env = create_template_env()
+
+# Per-template render statistics: name -> {'count': ..., 'total_ms': ..., 'max_ms': ...}
+template_render_stats = {}
+
+def record_render_time(template_name, elapsed_ms):
+    stats = template_render_stats.setdefault(template_name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    stats['count'] += 1
+    stats['total_ms'] += elapsed_ms
+    stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    app.logger.debug("Rendered %s in %.2f ms", template_name, elapsed_ms)
+
+# --- Helper functions to render templates ---
+def render_fragment(template_name, **context):
+    """Renders a template as-is, without injecting site settings."""
+    started = time.perf_counter()
+    html = template_env.get_template(template_name).render(**context)
+    record_render_time(template_name, (time.perf_counter() - started) * 1000)
+    return html
+
 def render(template_name, **context):
-    # Create a Jinja environment with a DictLoader.
-    # This allows template inheritance (e.g., {% extends "base.html" %}) to work correctly
-    # with templates stored as strings in a dictionary.
-    jinja_env = app.jinja_env.overlay()
-    jinja_env.loader = DictLoader(TEMPLATES)
-
-    # Inject settings into all templates
-    logo_setting = db.session.get(AppSetting, 'logo_url')
+    # Inject settings into all templates (served from the process-local cache)
+    logo_filename = settings_cache.get('logo_url')
     logo_url = None
-    if logo_setting and logo_setting.value:
-        logo_url = url_for('uploaded_file', filename=logo_setting.value)
+    if logo_filename:
+        logo_url = url_for('uploaded_file', filename=logo_filename)
     
     context['settings'] = {'logo_url': logo_url}
-
-    template = jinja_env.get_template(template_name)
-    return template.render(**context)
+    return render_fragment(template_name, **context)
+
+# --- Menu cache ---
+def resolve_image_url(image_url):
+    """Prepends the uploads path for locally stored images."""
+    if image_url and not image_url.startswith('http'):
+        return url_for('uploaded_file', filename=image_url)
+    return image_url
+
+# --- Upload storage ---
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+def upload_dir():
+    return os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+
+def stream_upload(file_storage, directory):
+    """Copies an upload into a temp file in chunks while hashing it; returns (temp_path, digest)."""
+    max_bytes = app.config['MAX_UPLOAD_BYTES']
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file_storage.stream.read(65536), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest()[:16]
+
+def image_variant_name(digest, width, extension):
+    return f"{digest}-{width}.{extension}"
+
+def parse_image_name(filename):
+    """Returns (digest, full_width) for a processed photo's name, or None for other files."""
+    stem, _, extension = filename.rpartition('.')
+    digest, _, full_width = stem.rpartition('-')
+    if extension != 'jpg' or len(digest) != 16 or not full_width.isdigit():
+        return None
+    return digest, int(full_width)
+
+def build_image_variants(path, digest, directory):
+    """Writes resized JPEG and WebP variants of an uploaded photo; returns the full-size JPEG name.
+
+    Transparent images keep their alpha in the WebP variants; the JPEGs, which
+    cannot store it, are flattened onto white.
+    """
+    image = ImageOps.exif_transpose(Image.open(path))
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if image.width > app.config['IMAGE_MAX_WIDTH']:
+        image = image.resize((app.config['IMAGE_MAX_WIDTH'],
+                              round(image.height * app.config['IMAGE_MAX_WIDTH'] / image.width)), Image.LANCZOS)
+    widths = [w for w in app.config['IMAGE_VARIANT_WIDTHS'] if w < image.width] + [image.width]
+    for width in widths:
+        variant = image if width == image.width else image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        flat = variant
+        if has_alpha:
+            flat = Image.new('RGB', variant.size, 'white')
+            flat.paste(variant, mask=variant.getchannel('A'))
+        flat.save(os.path.join(directory, image_variant_name(digest, width, 'jpg')), 'JPEG', quality=82, optimize=True, progressive=True)
+        variant.save(os.path.join(directory, image_variant_name(digest, width, 'webp')), 'WEBP', quality=80, method=4)
+    return image_variant_name(digest, image.width, 'jpg')
+
+def existing_image(digest, directory):
+    """Returns the full-size JPEG name if this photo was processed before, else None."""
+    names = [os.path.basename(path) for path in glob.glob(os.path.join(directory, f"{digest}-*.jpg"))]
+    parsed = [(parse_image_name(name), name) for name in names]
+    parsed = [(info[1], name) for info, name in parsed if info]
+    return max(parsed)[1] if parsed else None
+
+def save_food_image(file_storage):
+    """Stores an uploaded food photo as content-hashed variants and returns its name.
+
+    Raises UploadTooLarge, or OSError/DecompressionBombError for unusable images. A photo that is already stored
+    (same content, any filename) is not processed or written again.
+    """
+    directory = upload_dir()
+    temp_path, digest = stream_upload(file_storage, directory)
+    try:
+        name = existing_image(digest, directory)
+        if name is None:
+            # Resizing is CPU-bound, so it runs off the eventlet hub
+            name = tpool.execute(build_image_variants, temp_path, digest, directory)
+        return name
+    finally:
+        os.remove(temp_path)
+
+def save_logo(file_storage):
+    """Stores an uploaded logo under a content-hashed name and returns it. Raises UploadTooLarge."""
+    directory = upload_dir()
+    temp_path, digest = stream_upload(file_storage, directory)
+    extension = os.path.splitext(secure_filename(file_storage.filename))[1].lower()
+    name = f"logo-{digest}{extension}"
+    if os.path.exists(os.path.join(directory, name)):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, os.path.join(directory, name))
+    return name
+
+def upload_files_for(filename):
+    """All stored files behind an upload reference (every variant of a processed photo)."""
+    parsed = parse_image_name(filename)
+    if parsed is None:
+        return [filename]
+    return [os.path.basename(path) for path in glob.glob(os.path.join(upload_dir(), f"{parsed[0]}-*"))]
+
+def upload_reference_counts():
+    """Counts references to uploaded files from Food.image_url and the logo_url setting."""
+    counts = Counter(image_url for (image_url,) in db.session.query(Food.image_url))
+    logo = db.session.get(AppSetting, 'logo_url')
+    if logo and logo.value:
+        counts[logo.value] += 1
+    return counts
+
+def release_upload(filename):
+    """Deletes an upload's files if nothing references them any more. Call after committing."""
+    if not filename or filename.startswith('http') or upload_reference_counts()[filename] > 0:
+        return
+    for name in upload_files_for(filename):
+        path = upload_path(name)
+        if path and os.path.isfile(path):
+            os.remove(path)
+
+def collect_orphan_uploads(grace_seconds=3600):
+    """Deletes uploaded files that nothing references. Returns the number of files removed.
+
+    Files younger than grace_seconds are kept, so uploads still being saved are safe.
+    """
+    referenced = set()
+    for filename in upload_reference_counts():
+        if filename and not filename.startswith('http'):
+            referenced.update(upload_files_for(filename))
+    removed = 0
+    cutoff = time.time() - grace_seconds
+    with os.scandir(upload_dir()) as it:
+        for entry in it:
+            if entry.is_file() and entry.name not in referenced and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+def image_srcsets(filename):
+    """Returns (jpeg_srcset, webp_srcset) for a processed photo, or (None, None) for other images."""
+    parsed = parse_image_name(filename)
+    if parsed is None:
+        return None, None
+    digest, full_width = parsed
+    widths = sorted({w for w in app.config['IMAGE_VARIANT_WIDTHS'] if w < full_width} | {full_width})
+    srcsets = []
+    for ext in ('jpg', 'webp'):
+        entries = []
+        for width in widths:
+            name = image_variant_name(digest, width, ext)
+            path = upload_path(name)
+            if path and os.path.exists(path):
+                entries.append(f"{url_for('uploaded_file', filename=name)} {width}w")
+        srcsets.append(', '.join(entries) or None)
+    return tuple(srcsets)
+
+class MenuCache:
+    """Process-local snapshot of the menu and the rendered home page body.
+
+    Both are rebuilt lazily whenever the shared menu version changes.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self._foods = None
+        self._foods_by_id = None
+        self._home_html = None
+        self._loaded_version = None
+
+    def _refresh(self):
+        current = self.version.get()
+        if self._foods is None or current != self._loaded_version:
+            self._foods = []
+            for food in Food.query.order_by(Food.name).all():
+                srcset, webp_srcset = image_srcsets(food.image_url or '')
+                self._foods.append({'id': food.id, 'name': food.name, 'price': food.price,
+                                    'image_url': resolve_image_url(food.image_url),
+                                    'srcset': srcset, 'webp_srcset': webp_srcset})
+            self._foods_by_id = {food['id']: food for food in self._foods}
+            self._home_html = None
+            self._loaded_version = current
+
+    def foods(self):
+        self._refresh()
+        return self._foods
+
+    def foods_by_id(self):
+        self._refresh()
+        return self._foods_by_id
+
+    def home_html(self):
+        self._refresh()
+        if self._home_html is None:
+            self._home_html = render_fragment('home_menu.html', foods=self._foods)
+        return self._home_html
+
+    def invalidate(self):
+        self.version.bump()
+        self._foods = None
+        self._home_html = None
+
+menu_version = SharedVersion(os.path.join(app.instance_path, 'menu.version'))
+menu_cache = MenuCache(menu_version)
+
+# --- Cart pricing ---
+def price_cart(cart):
+    """Prices a session cart against the cached menu.
+
+    Shared by cart_page() and place_order() so both see the same lines and totals.
+    Costs at most one menu query (only when the menu version has changed).
+    """
+    foods = menu_cache.foods_by_id()
+    lines = []
+    subtotal = 0
+    for food_id, quantity in cart.items():
+        try:
+            food = foods.get(int(food_id))
+        except (TypeError, ValueError):
+            food = None
+        if food and quantity > 0:
+            line_subtotal = food['price'] * quantity
+            lines.append({'food': food, 'quantity': quantity, 'subtotal': line_subtotal})
+            subtotal += line_subtotal
+
+    # Only add delivery charge if there are items in the cart
+    delivery_charge = DELIVERY_CHARGE if lines else 0
+    return {'lines': lines, 'subtotal': subtotal, 'delivery_charge': delivery_charge,
+            'total': subtotal + delivery_charge}
+
+# --- Order writes ---
+class OrderGroupCommitter:
+    """Writes orders from concurrent checkouts in shared transactions (group commit).
+
+    Each checkout hands over plain order data and waits; a single writer green thread
+    collects whatever arrives within the window and commits it all at once, so a burst
+    costs one fsync and one write lock instead of one per order.
+    """
+
+    def __init__(self, window_ms, max_batch):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.queue = Queue()
+        self._worker = None
+
+    def submit(self, order_fields, item_rows):
+        """Queues an order and waits until it is committed. Returns the new order id."""
+        done = Event()
+        self.queue.put((order_fields, item_rows, done))
+        if self._worker is None:
+            self._worker = socketio.start_background_task(self._run)
+        return done.wait()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window_ms / 1000
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        with app.app_context():
+            orders = [Order(**order_fields, items=[OrderItem(**row) for row in item_rows])
+                      for order_fields, item_rows, _ in batch]
+            try:
+                db.session.add_all(orders)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for _, _, done in batch:
+                    done.send_exception(e)
+                return
+            for order, (_, _, done) in zip(orders, batch):
+                done.send(order.id)
+
+order_committer = None
+if app.config['ORDER_GROUP_COMMIT_MS'] > 0:
+    order_committer = OrderGroupCommitter(app.config['ORDER_GROUP_COMMIT_MS'], app.config['ORDER_GROUP_COMMIT_MAX'])
+
+def insert_order(order_fields, item_rows):
+    """Saves a new order with its items and returns it, attached to the current session."""
+    if order_committer is not None:
+        return db.session.get(Order, order_committer.submit(order_fields, item_rows))
+    order = Order(**order_fields, items=[OrderItem(**row) for row in item_rows])
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+def open_local_sqlite(path, synchronous='NORMAL'):
+    """Opens a host-local SQLite file shared by all workers (autocommit, WAL)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+class OrderQueueFull(Exception):
+    """Raised when the ingestion queue stays at its maximum depth for too long."""
+
+class OrderIngestQueue:
+    """Durable, bounded queue of validated and priced orders, backed by a local SQLite file.
+
+    Checkouts append to the queue and return at once; the queue row id is the order id,
+    so the customer gets it immediately. A writer green thread in each worker claims
+    batches, inserts them into the main database with those ids, and announces them.
+    When the queue is full, checkouts wait for the writer and eventually give up.
+    """
+
+    # Claimed rows not written within this many seconds are picked up again (e.g. after a crash)
+    CLAIM_TIMEOUT = 60
+
+    def __init__(self, path, max_depth, wait_seconds, batch_size, poll_ms):
+        self.path = path
+        self.max_depth = max_depth
+        self.wait_seconds = wait_seconds
+        self.batch_size = batch_size
+        self.poll_ms = poll_ms
+        self._conn = None
+        self._worker = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = open_local_sqlite(self.path, synchronous='FULL')
+            conn.execute("CREATE TABLE IF NOT EXISTS pending_order ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, "
+                         "created_at REAL NOT NULL, claimed_at REAL)")
+            # Dead letters: queued orders that could not be written, kept for the admin
+            conn.execute("CREATE TABLE IF NOT EXISTS failed_order ("
+                         "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL, "
+                         "failed_at REAL NOT NULL, reason TEXT NOT NULL)")
+            # Queue ids become order ids, so they must start above every existing order
+            max_order_id = db.session.query(db.func.max(Order.id)).scalar() or 0
+            # sqlite_sequence has no unique key, so only insert the row if it is missing
+            cursor = conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'pending_order'",
+                                  (max_order_id,))
+            if cursor.rowcount == 0:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('pending_order', ?)", (max_order_id,))
+            self._conn = conn
+        return self._conn
+
+    def depth(self):
+        return self._connection().execute("SELECT COUNT(*) FROM pending_order").fetchone()[0]
+
+    def is_pending(self, order_id):
+        return self._connection().execute("SELECT 1 FROM pending_order WHERE id = ?", (order_id,)).fetchone() is not None
+
+    def min_unwritten_id(self):
+        """Lowest id that may not be in the database yet; every lower id is saved or dead-lettered.
+
+        That is the oldest row still queued (claimed or not), or else the next id the queue hands out.
+        """
+        return self._connection().execute(
+            "SELECT COALESCE((SELECT MIN(id) FROM pending_order), "
+            "(SELECT seq FROM sqlite_sequence WHERE name = 'pending_order') + 1)").fetchone()[0]
+
+    def is_failed(self, order_id):
+        return self._connection().execute("SELECT 1 FROM failed_order WHERE id = ?", (order_id,)).fetchone() is not None
+
+    def failed_orders(self):
+        """Dead-lettered orders, oldest first, as plain objects for the admin dashboard."""
+        rows = self._connection().execute("SELECT id, payload, reason FROM failed_order ORDER BY id").fetchall()
+        failed = []
+        for order_id, payload, reason in rows:
+            data = json.loads(payload)
+            failed.append(SimpleNamespace(id=order_id, timestamp=datetime.fromisoformat(data['timestamp']),
+                                          reason=reason, **data['order']))
+        return failed
+
+    def dismiss_failed(self, order_id):
+        self._connection().execute("DELETE FROM failed_order WHERE id = ?", (order_id,))
+
+    def _dead_letter(self, order_id, reason):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO failed_order (id, payload, created_at, failed_at, reason) "
+                         "SELECT id, payload, created_at, ?, ? FROM pending_order WHERE id = ?",
+                         (time.time(), reason, order_id))
+            conn.execute("DELETE FROM pending_order WHERE id = ?", (order_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, order_fields, item_rows):
+        """Durably queues an order and returns its id; raises OrderQueueFull under sustained overload."""
+        conn = self._connection()
+        deadline = time.monotonic() + self.wait_seconds
+        while self.depth() >= self.max_depth:
+            if time.monotonic() >= deadline:
+                raise OrderQueueFull()
+            socketio.sleep(self.poll_ms / 1000)
+        payload = json.dumps({'order': order_fields, 'items': item_rows, 'timestamp': datetime.utcnow().isoformat()})
+        order_id = conn.execute("INSERT INTO pending_order (payload, created_at) VALUES (?, ?)",
+                                (payload, time.time())).lastrowid
+        self.start()
+        return order_id
+
+    def start(self):
+        """Starts this worker's writer green thread if it is not running yet."""
+        if self._worker is None:
+            self._worker = socketio.start_background_task(self._run)
+
+    def _claim(self):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT id, payload FROM pending_order WHERE claimed_at IS NULL OR claimed_at < ? "
+                                "ORDER BY id LIMIT ?", (now - self.CLAIM_TIMEOUT, self.batch_size)).fetchall()
+            conn.executemany("UPDATE pending_order SET claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _run(self):
+        while True:
+            try:
+                # A fresh context per batch, so each batch gets its own database session
+                with app.app_context():
+                    rows = self._claim()
+                    if rows:
+                        self._write(rows)
+                        continue
+            except Exception:
+                app.logger.exception("Order queue writer failed; will retry")
+            socketio.sleep(self.poll_ms / 1000)
+
+    @staticmethod
+    def _same_order(order, data):
+        return (order.timestamp == datetime.fromisoformat(data['timestamp'])
+                and all(getattr(order, field) == value for field, value in data['order'].items()))
+
+    def _write(self, rows):
+        ids = [row[0] for row in rows]
+        existing = {order.id: order for order in Order.query.filter(Order.id.in_(ids))}
+        orders = []
+        done = []
+        for order_id, payload in rows:
+            data = json.loads(payload)
+            if order_id in existing:
+                # A previous attempt died after committing but before dequeuing: a replay.
+                # Anything else (e.g. another host writing the same id) must not be dropped.
+                if not self._same_order(existing[order_id], data):
+                    app.logger.error("Queued order %s conflicts with a different saved order; "
+                                     "moved to the failed orders", order_id)
+                    self._dead_letter(order_id, "Order id already used by a different order")
+                    continue
+                done.append(order_id)
+                continue
+            done.append(order_id)
+            orders.append(Order(id=order_id, timestamp=datetime.fromisoformat(data['timestamp']),
+                                items=[OrderItem(**row) for row in data['items']], **data['order']))
+        try:
+            db.session.add_all(orders)
+            db.session.flush()
+            if db.engine.dialect.name == 'postgresql':
+                # Explicit ids don't advance the serial, so keep it past them
+                db.session.execute(text("SELECT setval(pg_get_serial_sequence('\"order\"', 'id'), "
+                                        "(SELECT MAX(id) FROM \"order\"))"))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self._connection().executemany("DELETE FROM pending_order WHERE id = ?", [(order_id,) for order_id in done])
+        for order in orders:
+            announce_order(order)
+
+order_queue = None
+if app.config['ORDER_QUEUE_PATH']:
+    order_queue = OrderIngestQueue(app.config['ORDER_QUEUE_PATH'], app.config['ORDER_QUEUE_MAX_DEPTH'],
+                                   app.config['ORDER_QUEUE_WAIT_SECONDS'], app.config['ORDER_QUEUE_BATCH_SIZE'],
+                                   app.config['ORDER_QUEUE_POLL_MS'])
+
+    @app.before_request
+    def start_order_queue_writer():
+        # Drains orders left in the queue by a previous process without waiting for a new checkout
+        order_queue.start()
+
+# --- Checkout idempotency ---
+class IdempotencyStore:
+    """Expiring map of checkout idempotency keys to order ids, shared by the workers on a host.
+
+    A key is reserved (with no order id yet) before the order is saved, so a second
+    submission racing the first waits for its result instead of creating another order.
+    """
+
+    POLL_SECONDS = 0.1
+    WAIT_SECONDS = 10
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path, ttl_seconds):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._conn = None
+        self._last_purge = 0
+
+    def _connection(self):
+        if self._conn is None:
+            conn = open_local_sqlite(self.path)
+            conn.execute("CREATE TABLE IF NOT EXISTS idempotency_key ("
+                         "key TEXT PRIMARY KEY, order_id INTEGER, expires_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge >= self.PURGE_INTERVAL:
+            self._connection().execute("DELETE FROM idempotency_key WHERE expires_at < ?", (now,))
+            self._last_purge = now
+
+    def reserve(self, key):
+        """Returns (True, None) if this call reserved the key, else (False, order_id or None)."""
+        self._purge_expired()
+        conn = self._connection()
+        cursor = conn.execute("INSERT OR IGNORE INTO idempotency_key (key, expires_at) VALUES (?, ?)",
+                              (key, time.time() + self.ttl_seconds))
+        if cursor.rowcount == 1:
+            return True, None
+        return False, self.order_id(key)
+
+    def order_id(self, key):
+        row = self._connection().execute("SELECT order_id FROM idempotency_key WHERE key = ? AND expires_at >= ?",
+                                         (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def wait_for_order(self, key):
+        """Waits for a concurrent submission holding the key to finish; returns its order id or None."""
+        deadline = time.monotonic() + self.WAIT_SECONDS
+        while time.monotonic() < deadline:
+            socketio.sleep(self.POLL_SECONDS)
+            order_id = self.order_id(key)
+            if order_id:
+                return order_id
+        return None
+
+    def complete(self, key, order_id):
+        self._connection().execute("UPDATE idempotency_key SET order_id = ? WHERE key = ?", (order_id, key))
+
+    def release(self, key):
+        self._connection().execute("DELETE FROM idempotency_key WHERE key = ? AND order_id IS NULL", (key,))
+
+idempotency_store = IdempotencyStore(app.config['IDEMPOTENCY_STORE_PATH'], app.config['IDEMPOTENCY_TTL_SECONDS'])
+
+# --- Server-side sessions ---
+# The cookie carries only an opaque session id; the data lives in a session store.
+def encode_session(data):
+    """Serializes session data compactly; the cart becomes a flat [food_id, quantity, ...] list."""
+    data = dict(data)
+    cart = data.pop('cart', None)
+    if cart:
+        data['_cart'] = [n for food_id, quantity in cart.items() for n in (int(food_id), quantity)]
+    return json.dumps(data, separators=(',', ':'), sort_keys=True)
+
+def decode_session(blob):
+    try:
+        data = json.loads(blob)
+    except ValueError:
+        return {}
+    cart = data.pop('_cart', None)
+    if cart:
+        data['cart'] = {str(food_id): quantity for food_id, quantity in zip(cart[::2], cart[1::2])}
+    return data
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and the stored encoding and expiry it was loaded from."""
+
+    def __init__(self, initial=None, sid=None, blob=None, expires_at=0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.blob = blob
+        self.expires_at = expires_at
+        self.previous_sid = None
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerate(self):
+        """Moves the data to a fresh id (e.g. on login) so a planted session id is useless."""
+        if self.sid:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.blob = None
+
+class MemorySessionStore:
+    """Session blobs in this worker's memory, least recently used evicted first."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (blob, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        """Returns (blob, expires_at), or None if the session is unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry
+
+    def save(self, sid, blob, expires_at):
+        with self._lock:
+            self._entries[sid] = (blob, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+class SqliteSessionStore:
+    """Session blobs in a host-local SQLite file, shared by all workers."""
+
+    PURGE_INTERVAL = 300
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._last_purge = 0
+
+    def _connection(self):
+        if self._conn is None:
+            conn = open_local_sqlite(self.path)
+            conn.execute("CREATE TABLE IF NOT EXISTS session_data ("
+                         "sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge >= self.PURGE_INTERVAL:
+            self._connection().execute("DELETE FROM session_data WHERE expires_at < ?", (now,))
+            self._last_purge = now
+
+    def get(self, sid):
+        """Returns (blob, expires_at), or None if the session is unknown or expired."""
+        row = self._connection().execute("SELECT data, expires_at FROM session_data WHERE sid = ? AND expires_at >= ?",
+                                         (sid, time.time())).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid, blob, expires_at):
+        self._purge_expired()
+        self._connection().execute("INSERT OR REPLACE INTO session_data (sid, data, expires_at) VALUES (?, ?, ?)",
+                                   (sid, blob, expires_at))
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM session_data WHERE sid = ?", (sid,))
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store and only an opaque random id in the cookie.
+
+    Nothing is signed, and the store is only written when the encoded data changes
+    or half the stored lifetime has passed, so browsing with an unchanged cart costs
+    one lookup per request. The cookie follows Flask's rules (a browser-session cookie
+    unless session.permanent); the stored copy lives for PERMANENT_SESSION_LIFETIME
+    if permanent, else SESSION_STORE_TTL_SECONDS.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        stored = self.store.get(sid) if sid else None
+        if stored is None:
+            # Unknown ids are never adopted; a new one is issued on the first write
+            return ServerSideSession()
+        blob, expires_at = stored
+        return ServerSideSession(decode_session(blob), sid=sid, blob=blob, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        blob = encode_session(session)
+        if session.permanent:
+            ttl = app.permanent_session_lifetime.total_seconds()
+        else:
+            ttl = app.config['SESSION_STORE_TTL_SECONDS']
+        now = time.time()
+        if blob == session.blob and session.expires_at - now > ttl / 2:
+            return
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.save(session.sid, blob, now + ttl)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            domain=domain, path=path,
+                            httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+def regenerate_session():
+    if isinstance(session._get_current_object(), ServerSideSession):
+        session.regenerate()
+
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = ServerSideSessionInterface(SqliteSessionStore(app.config['SESSION_STORE_PATH']))
+elif app.config['SESSION_BACKEND'] == 'memory':
+    app.session_interface = ServerSideSessionInterface(MemorySessionStore(app.config['SESSION_MEMORY_MAX_ENTRIES']))
+
+# --- Admin orders feed (keyset pagination) ---
+def encode_order_cursor(order):
+    return f"{order.timestamp.isoformat()}|{order.id}"
+
+def decode_order_cursor(cursor):
+    """Parses a cursor into (timestamp, id); returns None if it is malformed."""
+    try:
+        timestamp, order_id = cursor.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(order_id)
+    except ValueError:
+        return None
+
+def fetch_orders_page(before=None, limit=None):
+    """Returns one page of orders, newest first, and the cursor for the next page.
+
+    Pages are keyed on (timestamp, id) so each request costs the same however long
+    the history is, and items are loaded in one batch query instead of per order.
+    """
+    limit = limit or app.config['ADMIN_ORDERS_PAGE_SIZE']
+    query = Order.query.options(selectinload(Order.items)).order_by(Order.timestamp.desc(), Order.id.desc())
+    if before:
+        timestamp, order_id = before
+        query = query.filter(or_(Order.timestamp < timestamp,
+                                 and_(Order.timestamp == timestamp, Order.id < order_id)))
+    orders = query.limit(limit + 1).all()
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+def fetch_orders_after(order_id, limit=None):
+    """Returns orders newer than order_id (newest first), for catching up on missed pushes."""
+    limit = limit or app.config['ADMIN_ORDERS_PAGE_SIZE']
+    return (Order.query.options(selectinload(Order.items))
+            .filter(Order.id > order_id).order_by(Order.id.desc()).limit(limit).all())
+
+# --- HTTP caching (ETags and Cache-Control) ---
+
+# Changes whenever a deploy changes any template, so old ETags stop matching.
+TEMPLATES_DIGEST = hashlib.sha256(''.join(TEMPLATES[name] for name in sorted(TEMPLATES)).encode()).hexdigest()[:16]
+
+# Cache-Control for endpoints that don't set their own.
+CACHE_POLICIES = {
+    'index': 'private, no-cache',
+    'cart_page': 'no-store',
+    'api_cart': 'no-store',
+    'api_cart_add': 'no-store',
+    'api_cart_item': 'no-store',
+    'place_order': 'no-store',
+    'order_success': 'private, no-store',
+}
+DEFAULT_ADMIN_CACHE_POLICY = 'no-store'
+
+def make_etag(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+def upload_path(filename):
+    """Resolves an uploaded filename the same way send_from_directory does, or None."""
+    return safe_join(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), filename)
+
+# Content digests of uploaded files: path -> ((mtime_ns, size), digest)
+upload_digests = {}
+
+def file_digest(path):
+    st = os.stat(path)
+    stat_key = (st.st_mtime_ns, st.st_size)
+    cached = upload_digests.get(path)
+    if cached and cached[0] == stat_key:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    upload_digests[path] = (stat_key, digest.hexdigest()[:32])
+    return upload_digests[path][1]
+
+# Photo variants and logos are stored under their content hash (see save_food_image/save_logo)
+CONTENT_ADDRESSED_UPLOAD = re.compile(r'^(?:[0-9a-f]{16}-\d+\.(?:jpg|webp)|logo-[0-9a-f]{16}\.[a-z0-9]+)$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class UploadMemoryCache:
+    """Bounded LRU of small uploaded files, revalidated against os.stat on every hit."""
+
+    def __init__(self, max_bytes, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()  # path -> ((mtime_ns, size), data)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, st):
+        """Returns the file's bytes, or None if it is too large to cache."""
+        stat_key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stat_key:
+                self._entries.move_to_end(path)
+                return entry[1]
+        if st.st_size > min(self.max_file_bytes, self.max_bytes):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous:
+                self._size -= len(previous[1])
+            self._entries[path] = (stat_key, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+upload_memory_cache = UploadMemoryCache(app.config['UPLOADS_MEMORY_CACHE_BYTES'],
+                                        app.config['UPLOADS_MEMORY_CACHE_MAX_FILE'])
+
+def upload_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+def proxy_upload_response(filename, path):
+    """An empty response telling the fronting proxy to send the file itself (it also handles Range)."""
+    response = Response(mimetype=upload_mimetype(filename))
+    if app.config['UPLOADS_SENDFILE_MODE'] == 'x-accel':
+        response.headers['X-Accel-Redirect'] = app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/' + filename
+    else:
+        response.headers['X-Sendfile'] = path
+    return response
+
+@app.after_request
+def apply_cache_policy(response):
+    if 'Cache-Control' not in response.headers and request.endpoint:
+        policy = CACHE_POLICIES.get(request.endpoint)
+        if policy is None and (request.endpoint.startswith('admin_') or request.endpoint == 'download_bill'):
+            policy = DEFAULT_ADMIN_CACHE_POLICY
+        if policy:
+            response.headers['Cache-Control'] = policy
+    return response
 
 # --- Customer-facing Routes ---
 
 @app.route('/')
 def index():
-    all_foods = Food.query.order_by(Food.name).all()
-    # Prepend the correct path for locally stored images
-    for food in all_foods:
-        if food.image_url and not food.image_url.startswith('http'):
-            food.image_url = url_for('uploaded_file', filename=food.image_url)
-    return render('home.html', foods=all_foods)
+    # The page only varies with the menu, the settings, the templates and the cart badge.
+    etag = make_etag(menu_version.get(), settings_version.get(), TEMPLATES_DIGEST, len(session.get('cart', {})))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = make_response(render('home.html', menu_html=menu_cache.home_html()))
+    response.set_etag(etag)
+    return response
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    """Serves uploaded files."""
-    from flask import send_from_directory
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serves uploaded files from the memory cache, the proxy or disk, with Range support."""
+    path = upload_path(filename)
+    try:
+        st = os.stat(path) if path else None
+    except FileNotFoundError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
+        abort(404)
+
+    # Content-addressed names never change content, so the name is the ETag
+    immutable = CONTENT_ADDRESSED_UPLOAD.match(filename) is not None
+    etag = make_etag(filename) if immutable else file_digest(path)
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={app.config['UPLOADS_MAX_AGE']}"
+    if request.if_none_match.contains(etag):
+        response = not_modified(etag)
+    elif app.config['UPLOADS_SENDFILE_MODE']:
+        response = proxy_upload_response(filename, path)
+        response.set_etag(etag)
+    else:
+        data = upload_memory_cache.get(path, st)
+        if data is None:
+            response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, etag=etag)
+        else:
+            response = Response(data, mimetype=upload_mimetype(filename))
+            response.set_etag(etag)
+            response.last_modified = st.st_mtime
+            response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 @app.route('/cart/add/<int:food_id>', methods=['POST'])
 def add_to_cart(food_id):
@@ -678,27 +2259,83 @@ def add_to_cart(food_id):
     session.modified = True
     return redirect(url_for('index'))
 
+# --- Cart API (used by the home and cart pages; the form routes above remain the fallback) ---
+def cart_json(cart):
+    """The cart as the pages need it: badge count, priced lines and totals."""
+    pricing = price_cart(cart)
+    return jsonify({
+        'count': len(cart),
+        'items': [{'food_id': line['food']['id'], 'name': line['food']['name'], 'price': line['food']['price'],
+                   'quantity': line['quantity'], 'subtotal': line['subtotal']} for line in pricing['lines']],
+        'subtotal': pricing['subtotal'],
+        'delivery_charge': pricing['delivery_charge'],
+        'total': pricing['total'],
+    })
+
+def cart_api_error(message, status):
+    return jsonify({'error': message}), status
+
+def requested_quantity(payload, default=None):
+    try:
+        return int(payload.get('quantity', default))
+    except (TypeError, ValueError):
+        return None
+
+@app.route('/api/cart')
+def api_cart():
+    return cart_json(session.get('cart', {}))
+
+@app.route('/api/cart/items', methods=['POST'])
+def api_cart_add():
+    payload = request.get_json(silent=True) or {}
+    quantity = requested_quantity(payload, default=1)
+    try:
+        food_id = int(payload.get('food_id'))
+    except (TypeError, ValueError):
+        return cart_api_error("food_id is required.", 400)
+    if quantity is None or quantity < 1:
+        return cart_api_error("quantity must be a positive integer.", 400)
+    if food_id not in menu_cache.foods_by_id():
+        return cart_api_error("This item is no longer on the menu.", 404)
+
+    cart = session.setdefault('cart', {})
+    cart[str(food_id)] = cart.get(str(food_id), 0) + quantity
+    session.modified = True
+    return cart_json(cart)
+
+@app.route('/api/cart/items/<int:food_id>', methods=['PUT', 'DELETE'])
+def api_cart_item(food_id):
+    """PUT sets an item's quantity (0 removes it); DELETE removes it."""
+    if request.method == 'DELETE':
+        quantity = 0
+    else:
+        quantity = requested_quantity(request.get_json(silent=True) or {})
+        if quantity is None or quantity < 0:
+            return cart_api_error("quantity must be a non-negative integer.", 400)
+
+    # The session is only written when the cart actually changes
+    cart = session.get('cart', {})
+    key = str(food_id)
+    if quantity == 0:
+        if key in cart:
+            del cart[key]
+            if not cart:
+                session.pop('cart')
+            session.modified = True
+    elif key in cart:
+        if cart[key] != quantity:
+            cart[key] = quantity
+            session.modified = True
+    else:
+        return cart_api_error("This item is not in the cart.", 404)
+    return cart_json(cart)
+
 @app.route('/cart')
 def cart_page():
-    cart = session.get('cart', {})
-    cart_items = []
-    subtotal = 0
-    
-    for food_id, quantity in cart.items():
-        food = db.session.get(Food, food_id)
-        if food:
-            item_subtotal = food.price * quantity
-            cart_items.append({'food': food, 'quantity': quantity, 'subtotal': item_subtotal})
-            subtotal += item_subtotal
-    
-    delivery_charge = 0
-    if cart_items: # Only add delivery charge if there are items in the cart
-        delivery_charge = DELIVERY_CHARGE
-    
-    total_bill = subtotal + delivery_charge
-            
-    return render('order.html', cart_items=cart_items, subtotal=subtotal, 
-                  delivery_charge=delivery_charge, total_bill=total_bill, error=request.args.get('error'))
+    pricing = price_cart(session.get('cart', {}))
+    return render('order.html', cart_items=pricing['lines'], subtotal=pricing['subtotal'],
+                  delivery_charge=pricing['delivery_charge'], total_bill=pricing['total'],
+                  idempotency_key=secrets.token_urlsafe(16), error=request.args.get('error'))
 
 @app.route('/cart/clear')
 def clear_cart():
@@ -713,55 +2350,80 @@ def place_order():
         error_msg = "Our order service is not available in this location."
         return redirect(url_for('cart_page', error=error_msg))
 
-    # Extract form data
-    customer_name = request.form.get('customer_name')
-    customer_phone = request.form.get('customer_phone')
-    full_address = request.form.get('customer_address')
-    landmark = request.form.get('landmark')
+    # A resubmitted checkout form gets the original order instead of a new one
+    idempotency_key = request.form.get('idempotency_key')
+    if idempotency_key:
+        reserved, order_id = idempotency_store.reserve(idempotency_key)
+        if not reserved:
+            order_id = order_id or idempotency_store.wait_for_order(idempotency_key)
+            if order_id is None:
+                return redirect(url_for('cart_page'))
+            session.pop('cart', None)
+            return redirect(url_for('order_success', order_id=order_id))
+
+    order_id = None
+    try:
+        # Extract form data
+        customer_name = request.form.get('customer_name')
+        customer_phone = request.form.get('customer_phone')
+        full_address = request.form.get('customer_address')
+        landmark = request.form.get('landmark')
     
-    # Combine address parts
-    delivery_address = f"{full_address}, Landmark: {landmark}, PIN: {pincode}"
-
-    cart = session.get('cart', {})
-    if not cart:
-        return redirect(url_for('cart_page'))
+        # Combine address parts
+        delivery_address = f"{full_address}, Landmark: {landmark}, PIN: {pincode}"
+
+        cart = session.get('cart', {})
+        if not cart:
+            return redirect(url_for('cart_page'))
+
+        pricing = price_cart(cart)
+        if not pricing['lines']:
+            return redirect(url_for('cart_page'))
+
+        item_rows = [
+            {'food_name': line['food']['name'], 'quantity': line['quantity'], 'price': line['food']['price']}
+            for line in pricing['lines']
+        ]
+
+        order_fields = {
+            'customer_name': customer_name,
+            'customer_phone': customer_phone,
+            'customer_address': delivery_address,
+            'total_bill': pricing['total'],
+        }
 
-    subtotal = 0
-    order_items = []
-    
-    for food_id, quantity in cart.items():
-        food = db.session.get(Food, food_id)
-        if food and quantity > 0:
-            subtotal += food.price * quantity
-            order_items.append(OrderItem(
-                food_name=food.name,
-                quantity=quantity,
-                price=food.price
-            ))
-
-    if not order_items:
-        return redirect(url_for('cart_page'))
-
-    total_bill = subtotal + DELIVERY_CHARGE
-
-    # Create new order
-    new_order = Order(
-        customer_name=customer_name,
-        customer_phone=customer_phone,
-        customer_address=delivery_address,
-        total_bill=total_bill,
-        items=order_items
-    )
-    db.session.add(new_order)
-    db.session.commit()
+        if order_queue is not None:
+            # Queue the order; the queue writer saves and announces it
+            try:
+                order_id = order_queue.enqueue(order_fields, item_rows)
+            except OrderQueueFull:
+                error_msg = "We are receiving a lot of orders right now. Please try again in a moment."
+                return redirect(url_for('cart_page', error=error_msg))
+        else:
+            # Create new order
+            new_order = insert_order(order_fields, item_rows)
+            announce_order(new_order)
+            order_id = new_order.id
 
-    session.pop('cart', None) # Clear cart after order
-    socketio.emit('new_order', {'msg': f'New order #{new_order.id} placed!'}, namespace='/')
-    return redirect(url_for('order_success', order_id=new_order.id))
+        session.pop('cart', None) # Clear cart after order
+        return redirect(url_for('order_success', order_id=order_id))
+    finally:
+        if idempotency_key:
+            if order_id is not None:
+                idempotency_store.complete(idempotency_key, order_id)
+            else:
+                idempotency_store.release(idempotency_key)
 
 @app.route('/order/success/<int:order_id>')
 def order_success(order_id):
-    order = db.get_or_404(Order, order_id)
+    if order_queue is not None and order_queue.is_failed(order_id):
+        # The saved order under this id (if any) belongs to someone else
+        return render('order_pending.html', order_id=order_id, failed=True)
+    order = db.session.get(Order, order_id)
+    if order is None:
+        if order_queue is not None and order_queue.is_pending(order_id):
+            return render('order_pending.html', order_id=order_id)
+        abort(404)
     return render('order_success.html', order=order)
 
 # --- Admin Routes ---
@@ -775,6 +2437,7 @@ def admin_login():
         username = request.form['username']
         password = request.form['password']
         if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+            regenerate_session()
             session['admin_logged_in'] = True
             return redirect(url_for('admin_dashboard'))
         else:
@@ -787,12 +2450,19 @@ def admin_dashboard():
     if 'admin_logged_in' not in session:
         return redirect(url_for('admin_login', error=request.args.get('error')))
     
-    foods = Food.query.order_by(Food.name).all()
-    orders = Order.query.order_by(Order.timestamp.desc()).all()
-    for food in foods:
-        if food.image_url and not food.image_url.startswith('http'):
-            food.image_url = url_for('uploaded_file', filename=food.image_url)
-    return render('admin_dashboard.html', foods=foods, orders=orders, error=request.args.get('error'))
+    foods = menu_cache.foods()
+    orders, next_cursor = fetch_orders_page()
+    failed_orders = order_queue.failed_orders() if order_queue is not None else []
+    return render('admin_dashboard.html', foods=foods, orders=orders, next_cursor=next_cursor,
+                  failed_orders=failed_orders, error=request.args.get('error'))
+
+@app.route('/admin/failed-orders/<int:order_id>/dismiss', methods=['POST'])
+def admin_dismiss_failed_order(order_id):
+    if 'admin_logged_in' not in session:
+        return redirect(url_for('admin_login'))
+    if order_queue is not None:
+        order_queue.dismiss_failed(order_id)
+    return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/logout')
 def admin_logout():
@@ -811,17 +2481,21 @@ def admin_add_edit_food():
 
     filename = None
     if image_file and image_file.filename != '':
-        filename = secure_filename(image_file.filename)
-        image_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-
+        try:
+            filename = save_food_image(image_file)
+        except UploadTooLarge:
+            return redirect(url_for('admin_dashboard', error="The uploaded image is too large."))
+        except (OSError, Image.DecompressionBombError):
+            # Unreadable, truncated or absurdly large images (UnidentifiedImageError is an OSError)
+            return redirect(url_for('admin_dashboard', error="The uploaded file is not a supported image."))
+
+    replaced_image = None
     if food_id: # Edit existing food
         food = db.session.get(Food, food_id)
         food.name = name
         food.price = price
-        if filename:
-            # Optionally, delete the old file
-            # if food.image_url and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], food.image_url)):
-            #     os.remove(os.path.join(app.config['UPLOAD_FOLDER'], food.image_url))
+        if filename and filename != food.image_url:
+            replaced_image = food.image_url
             food.image_url = filename
     else: # Add new food
         if not filename: # Image is required for new food
@@ -831,6 +2505,9 @@ def admin_add_edit_food():
         db.session.add(new_food)
     
     db.session.commit()
+    menu_cache.invalidate()
+    # Delete the old image once nothing references it
+    release_upload(replaced_image)
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/food/delete/<int:food_id>')
@@ -839,8 +2516,11 @@ def admin_delete_food(food_id):
         return redirect(url_for('admin_login'))
     
     food = db.get_or_404(Food, food_id)
+    image_url = food.image_url
     db.session.delete(food)
     db.session.commit()
+    menu_cache.invalidate()
+    release_upload(image_url)
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/settings', methods=['POST'])
@@ -850,51 +2530,258 @@ def admin_settings():
 
     logo_file = request.files.get('logo_file')
     if logo_file and logo_file.filename != '':
-        filename = secure_filename(f"logo_{datetime.now().timestamp()}{os.path.splitext(logo_file.filename)[1]}")
-        logo_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        try:
+            filename = save_logo(logo_file)
+        except UploadTooLarge:
+            return redirect(url_for('admin_dashboard', error="The uploaded logo is too large."))
 
-        # Update setting in DB
-        logo_setting = db.session.get(AppSetting, 'logo_url')
-        if logo_setting:
-            logo_setting.value = filename
-        else:
-            logo_setting = AppSetting(key='logo_url', value=filename)
-            db.session.add(logo_setting)
-        db.session.commit()
+        # Update setting in DB and invalidate the settings cache in every worker
+        old_logo = settings_cache.get('logo_url')
+        settings_cache.set('logo_url', filename)
+        if old_logo != filename:
+            release_upload(old_logo)
 
     return redirect(url_for('admin_dashboard'))
 
+@app.errorhandler(413)
+def upload_too_large(error):
+    # Requests over MAX_CONTENT_LENGTH are rejected before the upload is streamed, so
+    # the admin forms would otherwise get a bare 413 page instead of their usual error.
+    if request.endpoint == 'admin_add_edit_food':
+        return redirect(url_for('admin_dashboard', error="The uploaded image is too large."))
+    if request.endpoint == 'admin_settings':
+        return redirect(url_for('admin_dashboard', error="The uploaded logo is too large."))
+    return error
+
+# --- Socket.IO ---
+ADMIN_ROOM = 'admins'
+
+@socketio.on('connect')
+def handle_connect():
+    # Order pushes carry customer details, so only logged-in admins receive them
+    if 'admin_logged_in' in session:
+        join_room(ADMIN_ROOM)
+
+class OrderEventBatcher:
+    """Collects new-order pushes for a short window and emits them as one 'new_orders' event."""
+
+    def __init__(self, window_ms):
+        self.window_ms = window_ms
+        self._pending = []
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        if self.window_ms <= 0:
+            self._emit([event])
+            return
+        with self._lock:
+            self._pending.append(event)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        socketio.sleep(self.window_ms / 1000)
+        with self._lock:
+            events, self._pending = self._pending, []
+            self._flush_scheduled = False
+        if events:
+            self._emit(events)
+
+    def _emit(self, events):
+        events.sort(key=lambda event: event['seq'])
+        socketio.emit('new_orders', {'orders': events}, namespace='/', to=ADMIN_ROOM)
+
+new_order_batcher = OrderEventBatcher(app.config['NEW_ORDER_BATCH_WINDOW_MS'])
+
+def announce_order(order):
+    """Tells admins and order_placed subscribers about a newly saved order."""
+    # Push just this order; order ids double as the sequence numbers the dashboard uses to spot gaps
+    new_order_batcher.add({
+        'msg': f'New order #{order.id} placed!',
+        'seq': order.id,
+        'html': render_fragment('admin_order_card.html', order=order),
+    })
+    order_placed.send(app, order_id=order.id)
+
 # --- AJAX and Bill Download Routes ---
 
 @app.route('/admin/orders')
 def admin_get_orders():
-    """Endpoint for AJAX to fetch updated orders list."""
+    """Endpoint for AJAX to fetch a page of the orders list (newest page by default)."""
+    if 'admin_logged_in' not in session:
+        return "Unauthorized", 401
+    if request.args.get('after'):
+        try:
+            after = int(request.args['after'])
+        except ValueError:
+            return "Invalid sequence number", 400
+        return render('admin_orders_partial.html', orders=fetch_orders_after(after), paged=True)
+
+    before = None
+    if request.args.get('before'):
+        before = decode_order_cursor(request.args['before'])
+        if before is None:
+            return "Invalid cursor", 400
+    orders, next_cursor = fetch_orders_page(before)
+    return render('admin_orders_partial.html', orders=orders, next_cursor=next_cursor, paged=before is not None)
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    if 'admin_logged_in' not in session:
+        return redirect(url_for('admin_login'))
+    return render('admin_analytics.html', summary=sales_summary(analytics_days()))
+
+@app.route('/admin/analytics.json')
+def admin_analytics_data():
+    """Sales KPIs as JSON, read from the rollup tables."""
+    if 'admin_logged_in' not in session:
+        return "Unauthorized", 401
+    return jsonify(sales_summary(analytics_days()))
+
+def analytics_days():
+    return min(max(request.args.get('days', 30, type=int), 1), 366)
+
+@app.route('/admin/archive')
+def admin_archive():
+    """Searches archived orders by order id, phone number and/or date range."""
+    if 'admin_logged_in' not in session:
+        return redirect(url_for('admin_login'))
+    if order_archive is None:
+        return render('admin_archive.html', orders=[], query=request.args,
+                      error="Order archiving is disabled because ARCHIVE_DIR is not set.")
+    try:
+        orders = search_archive(request.args)
+    except ValueError:
+        return render('admin_archive.html', orders=[], error="Invalid search.", query=request.args)
+    if request.args.get('format') == 'json':
+        return jsonify([bill_to_json(bill) for bill in orders])
+    return render('admin_archive.html', orders=[archived_order_view(bill) for bill in orders],
+                  error=None, query=request.args)
+
+def search_archive(args):
+    query = args.get('q', '').strip().lstrip('#')
+    start = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else None
+    end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else None
+    if order_archive is None or not (query or start or end):
+        return []
+    return order_archive.search(text=query or None, start=start, end=end)
+
+@app.route('/admin/template-stats')
+def admin_template_stats():
+    """Reports per-template render timings for this worker process."""
     if 'admin_logged_in' not in session:
         return "Unauthorized", 401
-    orders = Order.query.order_by(Order.timestamp.desc()).all()
-    return render('admin_orders_partial.html', orders=orders)
+    report = {}
+    for name, stats in template_render_stats.items():
+        report[name] = dict(stats, avg_ms=stats['total_ms'] / stats['count'])
+    return jsonify(report)
 
 @app.route('/download-bill/<int:order_id>')
 def download_bill(order_id):
     if 'admin_logged_in' not in session:
         return redirect(url_for('admin_login'))
 
-    order = db.get_or_404(Order, order_id)
-    
-    buffer = BytesIO()
-    
-    # Page size for a 58mm thermal printer (58mm ~ 164 points)
-    page_width = 164
-    # Set small margins
-    doc = SimpleDocTemplate(buffer, pagesize=(page_width, 800), leftMargin=5, rightMargin=5, topMargin=10, bottomMargin=10)
-    
+    order = db.session.get(Order, order_id)
+    if order is not None:
+        load_bill = lambda: bill_data(order)
+    else:
+        # Older orders live in the archive
+        archived = order_archive.find(order_id) if order_archive is not None else None
+        if archived is None:
+            abort(404)
+        load_bill = lambda: archived
+
+    # Raw printer formats are cheap enough to render on every request
+    bill_format = request.args.get('format', 'pdf')
+    if bill_format == 'text':
+        return Response(render_bill_text(load_bill()), mimetype='text/plain')
+    if bill_format == 'escpos':
+        return send_file(BytesIO(render_bill_escpos(load_bill())), as_attachment=True,
+                         download_name=f'bill_order_{order_id}.bin', mimetype='application/octet-stream')
+
+    pdf = bill_cache.get_or_render(order_id, load_bill)
+    return send_file(BytesIO(pdf), as_attachment=True, download_name=f'bill_order_{order_id}.pdf', mimetype='application/pdf')
+
+@app.route('/admin/bills/export')
+def admin_export_bills():
+    """Exports many bills at once, as a ZIP of receipts or one multi-page PDF."""
+    if 'admin_logged_in' not in session:
+        return redirect(url_for('admin_login'))
+    try:
+        order_ids, start, end = parse_export_selection(request.args)
+    except ValueError as e:
+        return redirect(url_for('admin_dashboard', error=str(e)))
+
+    if request.args.get('format') == 'pdf':
+        max_orders = app.config['BILL_EXPORT_PDF_MAX_ORDERS']
+        if export_query(order_ids, start, end).count() > max_orders:
+            return redirect(url_for('admin_dashboard', error=f"A single PDF can hold at most {max_orders} orders. "
+                                                             "Use the ZIP export for larger selections."))
+
+    bills = iter_export_bills(order_ids, start, end)
+    if request.args.get('format') == 'pdf':
+        body, mimetype, extension = stream_bills_pdf(bills), 'application/pdf', 'pdf'
+    else:
+        body, mimetype, extension = stream_bills_zip(bills), 'application/zip', 'zip'
+    filename = f"bills_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# ==============================================================================
+# Чеки (Bills)
+# ==============================================================================
+
+def build_receipt_styles():
     styles = getSampleStyleSheet()
     # Custom smaller styles for receipt
     styles.add(ParagraphStyle(name='Center', alignment=1, fontSize=10, leading=12))
     styles.add(ParagraphStyle(name='NormalSmall', fontSize=8, leading=10))
     styles.add(ParagraphStyle(name='ItemStyle', fontSize=8, leading=10, wordWrap='CJK'))
     styles.add(ParagraphStyle(name='TotalStyle', alignment=2, fontSize=9, fontName='Helvetica-Bold', leading=12))
-    
+    return styles
+
+# Built once per process; styles are only read while rendering.
+RECEIPT_STYLES = build_receipt_styles()
+
+def bill_data(order):
+    """Snapshots an order into plain data, so rendering doesn't touch the database."""
+    return {
+        'id': order.id,
+        'timestamp': order.timestamp,
+        'customer_name': order.customer_name,
+        'customer_phone': order.customer_phone,
+        'customer_address': order.customer_address,
+        'total_bill': order.total_bill,
+        'items': [{'food_name': item.food_name, 'quantity': item.quantity, 'price': item.price}
+                  for item in order.items],
+    }
+
+# Page size for a 58mm thermal printer (58mm ~ 164 points), with small margins
+RECEIPT_PAGE_SIZE = (164, 800)
+RECEIPT_MARGINS = {'leftMargin': 5, 'rightMargin': 5, 'topMargin': 10, 'bottomMargin': 10}
+
+def receipt_doc(fileobj):
+    return SimpleDocTemplate(fileobj, pagesize=RECEIPT_PAGE_SIZE, **RECEIPT_MARGINS)
+
+def receipt_frame():
+    """The frame receipt_doc() lays bills out in, for drawing straight onto a canvas."""
+    width, height = RECEIPT_PAGE_SIZE
+    return Frame(RECEIPT_MARGINS['leftMargin'], RECEIPT_MARGINS['bottomMargin'],
+                 width - RECEIPT_MARGINS['leftMargin'] - RECEIPT_MARGINS['rightMargin'],
+                 height - RECEIPT_MARGINS['topMargin'] - RECEIPT_MARGINS['bottomMargin'])
+
+def render_bill_pdf(bill):
+    """Renders a 58mm thermal receipt PDF for the given bill data and returns the bytes."""
+    buffer = BytesIO()
+    receipt_doc(buffer).build(bill_flowables(bill))
+    return buffer.getvalue()
+
+def bill_flowables(bill):
+    """Builds the receipt elements for one bill."""
+    styles = RECEIPT_STYLES
     elements = []
     
     # --- Receipt Header ---
@@ -903,18 +2790,18 @@ def download_bill(order_id):
     elements.append(Paragraph("---------------------------------", styles['Center']))
     
     # --- Order Details ---
-    elements.append(Paragraph(f"Order: #{order.id}", styles['NormalSmall']))
-    elements.append(Paragraph(f"Date: {order.timestamp.strftime('%d-%m-%y %H:%M')}", styles['NormalSmall']))
-    elements.append(Paragraph(f"Name: {order.customer_name}", styles['NormalSmall']))
+    elements.append(Paragraph(f"Order: #{bill['id']}", styles['NormalSmall']))
+    elements.append(Paragraph(f"Date: {bill['timestamp'].strftime('%d-%m-%y %H:%M')}", styles['NormalSmall']))
+    elements.append(Paragraph(f"Name: {bill['customer_name']}", styles['NormalSmall']))
     elements.append(Paragraph("---------------------------------", styles['Center']))
 
     # --- Items Table (simplified for narrow format) ---
     data = []
-    for item in order.items:
+    for item in bill['items']:
         # Item name on one line
-        data.append([Paragraph(item.food_name, styles['ItemStyle']), ''])
+        data.append([Paragraph(item['food_name'], styles['ItemStyle']), ''])
         # Quantity, price, and subtotal on the next line, right-aligned
-        price_details = f"{item.quantity} x Rs {item.price:.2f} = Rs {item.price * item.quantity:.2f}"
+        price_details = f"{item['quantity']} x Rs {item['price']:.2f} = Rs {item['price'] * item['quantity']:.2f}"
         data.append(['', Paragraph(price_details, styles['TotalStyle'])])
 
     # Create the table for items
@@ -928,7 +2815,7 @@ def download_bill(order_id):
     elements.append(item_table)
 
     # --- Subtotal and Delivery Charge ---
-    subtotal = order.total_bill - DELIVERY_CHARGE
+    subtotal = bill['total_bill'] - DELIVERY_CHARGE
     summary_data = [
         [Paragraph(f"Subtotal:", styles['NormalSmall']), Paragraph(f"Rs {subtotal:.2f}", styles['TotalStyle'])],
         [Paragraph(f"Delivery Charge:", styles['NormalSmall']), Paragraph(f"Rs {DELIVERY_CHARGE:.2f}", styles['TotalStyle'])]
@@ -943,7 +2830,7 @@ def download_bill(order_id):
     # Wrap the content in Paragraph objects to correctly render the <b> tags
     total_data = [[
         Paragraph('<b>Total Bill:</b>', styles['NormalSmall']),
-        Paragraph(f"<b>Rs {order.total_bill:.2f}</b>", styles['TotalStyle'])
+        Paragraph(f"<b>Rs {bill['total_bill']:.2f}</b>", styles['TotalStyle'])
     ]]
     total_table = Table(total_data, colWidths=[80, 74])
     total_table.setStyle(TableStyle([
@@ -952,22 +2839,740 @@ def download_bill(order_id):
     elements.append(total_table)
     elements.append(Spacer(1, 12))
     elements.append(Paragraph("Visit Again!", styles['Center']))
-    
-    doc.build(elements)
-    
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f'bill_order_{order.id}.pdf', mimetype='application/pdf')
+    return elements
+
+# ReportLab is CPU-bound and would block the eventlet hub (and every socket on the
+# worker) while it runs, so renders go to eventlet's native thread pool instead.
+bill_render_slots = Semaphore(app.config['BILL_RENDER_CONCURRENCY'])
+
+def render_bill_pdf_offloaded(bill):
+    """Renders a bill in the thread pool; the calling green thread waits without blocking the hub."""
+    with bill_render_slots:
+        return tpool.execute(render_bill_pdf, bill)
+
+# --- Thermal printer receipts (plain text and ESC/POS) ---
+# Characters per line on a 58mm printer using the default font.
+RECEIPT_WIDTH = 32
+
+ESC_INIT = b'\x1b@'
+ESC_ALIGN = {'left': b'\x1ba\x00', 'center': b'\x1ba\x01', 'right': b'\x1ba\x02'}
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+ESC_FEED_AND_CUT = b'\x1bd\x03\x1dV\x42\x00'
+
+def receipt_columns(left, right):
+    return left + right.rjust(RECEIPT_WIDTH - len(left))
+
+def receipt_lines(bill):
+    """Lays a bill out as (text, align, bold) lines with the same content as the PDF receipt."""
+    rule = '-' * RECEIPT_WIDTH
+    lines = [
+        ("FOODIFY", 'center', True),
+        ("Thank you for your order!", 'center', False),
+        (rule, 'left', False),
+        (f"Order: #{bill['id']}", 'left', False),
+        (f"Date: {bill['timestamp'].strftime('%d-%m-%y %H:%M')}", 'left', False),
+        (f"Name: {bill['customer_name']}", 'left', False),
+        (rule, 'left', False),
+    ]
+    for item in bill['items']:
+        for name_line in textwrap.wrap(item['food_name'], RECEIPT_WIDTH) or ['']:
+            lines.append((name_line, 'left', False))
+        price_details = f"{item['quantity']} x Rs {item['price']:.2f} = Rs {item['price'] * item['quantity']:.2f}"
+        lines.append((price_details, 'right', False))
+    subtotal = bill['total_bill'] - DELIVERY_CHARGE
+    lines += [
+        (receipt_columns("Subtotal:", f"Rs {subtotal:.2f}"), 'left', False),
+        (receipt_columns("Delivery Charge:", f"Rs {DELIVERY_CHARGE:.2f}"), 'left', False),
+        (rule, 'left', False),
+        (receipt_columns("Total Bill:", f"Rs {bill['total_bill']:.2f}"), 'left', True),
+        ("", 'left', False),
+        ("Visit Again!", 'center', False),
+    ]
+    return lines
+
+def render_bill_text(bill):
+    """Renders a bill as fixed-width plain text."""
+    out = []
+    for text, align, _ in receipt_lines(bill):
+        if align == 'center':
+            text = text.center(RECEIPT_WIDTH).rstrip()
+        elif align == 'right':
+            text = text.rjust(RECEIPT_WIDTH)
+        out.append(text)
+    return '\n'.join(out) + '\n'
+
+def render_bill_escpos(bill):
+    """Renders a bill as a raw ESC/POS byte stream, ending with a paper cut."""
+    out = [ESC_INIT]
+    for text, align, bold in receipt_lines(bill):
+        out.append(ESC_ALIGN[align])
+        if bold:
+            out.append(ESC_BOLD_ON)
+        out.append(text.encode('ascii', 'replace') + b'\n')
+        if bold:
+            out.append(ESC_BOLD_OFF)
+    out.append(ESC_FEED_AND_CUT)
+    return b''.join(out)
+
+class BillCache:
+    """Size-bounded on-disk cache of rendered bill PDFs, keyed by order id.
+
+    When the cache grows past max_bytes the least recently used bills are removed,
+    down to EVICT_TO of the budget so the next puts don't have to evict again.
+    Each worker keeps a running estimate of the cache size and only scans the
+    directory when that estimate passes the budget, or every RESCAN_SECONDS to
+    pick up bills written by the other workers.
+    """
+
+    EVICT_TO = 0.9
+    RESCAN_SECONDS = 60
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # Unknown until the first scan
+        self._scanned_at = 0.0
+
+    def _path(self, order_id):
+        return os.path.join(self.directory, f'bill_{int(order_id)}.pdf')
+
+    def get(self, order_id):
+        path = self._path(order_id)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # Mark as recently used
+        return data
+
+    def put(self, order_id, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(order_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        replaced = self._file_size(path)
+        os.replace(tmp_path, path)
+        if self._size is not None:
+            self._size += len(data) - replaced
+        if (self._size is None or self._size > self.max_bytes
+                or time.monotonic() - self._scanned_at >= self.RESCAN_SECONDS):
+            self._evict()
+
+    def discard(self, order_id):
+        path = self._path(order_id)
+        size = self._file_size(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def get_or_render(self, order_id, load_bill):
+        """Returns the cached PDF, or renders load_bill()'s data and caches it."""
+        pdf = self.get(order_id)
+        if pdf is None:
+            pdf = render_bill_pdf_offloaded(load_bill())
+            self.put(order_id, pdf)
+        return pdf
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * self.EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._size = total
+        self._scanned_at = time.monotonic()
+
+bill_cache = BillCache(app.config['BILL_CACHE_DIR'], app.config['BILL_CACHE_MAX_BYTES'])
+
+# --- Bulk bill export ---
+EXPORT_BATCH_SIZE = 100
+
+def parse_export_selection(args):
+    """Reads order ids and/or a date range from the query string; raises ValueError if malformed."""
+    order_ids = [int(part) for part in args.get('ids', '').split(',') if part.strip()]
+    start = datetime.strptime(args['start'], '%Y-%m-%d') if args.get('start') else None
+    end = datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1) if args.get('end') else None
+    if not order_ids and not (start or end):
+        raise ValueError("Select orders by id or by date range.")
+    return order_ids, start, end
+
+def export_query(order_ids, start, end):
+    query = Order.query
+    if order_ids:
+        query = query.filter(Order.id.in_(order_ids))
+    if start:
+        query = query.filter(Order.timestamp >= start)
+    if end:
+        query = query.filter(Order.timestamp < end)
+    return query
+
+def iter_export_bills(order_ids, start, end):
+    """Yields bill data for the selected orders in id order, one small batch in memory at a time."""
+    query = export_query(order_ids, start, end).options(selectinload(Order.items)).order_by(Order.id)
+    last_id = 0
+    while True:
+        batch = query.filter(Order.id > last_id).limit(EXPORT_BATCH_SIZE).all()
+        if not batch:
+            return
+        for order in batch:
+            yield bill_data(order)
+        last_id = batch[-1].id
+
+def render_bills_parallel(bills):
+    """Yields (bill, pdf) in input order, keeping a bounded number of renders in flight.
+
+    Each render is a green thread waiting on the native thread pool, so at most
+    BILL_RENDER_CONCURRENCY run at once (see bill_render_slots) and the next few
+    are already queued behind them.
+    """
+    in_flight = deque()
+    max_in_flight = app.config['BILL_RENDER_CONCURRENCY'] * 2
+    for bill in bills:
+        in_flight.append((bill, spawn(render_bill_pdf_offloaded, bill)))
+        if len(in_flight) >= max_in_flight:
+            done_bill, render = in_flight.popleft()
+            yield done_bill, render.wait()
+    while in_flight:
+        done_bill, render = in_flight.popleft()
+        yield done_bill, render.wait()
+
+class ZipStream(io.RawIOBase):
+    """Write-only sink that lets zipfile produce an archive chunk by chunk."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_bills_zip(bills):
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for bill, pdf in render_bills_parallel(bills):
+            archive.writestr(f"bill_order_{bill['id']}.pdf", pdf)
+            yield sink.drain()
+    yield sink.drain()
+
+def draw_bill_pages(pdf_canvas, bill):
+    """Lays one bill out on its own page(s) of the canvas; a receipt normally fits on one."""
+    flowables = bill_flowables(bill)
+    while flowables:
+        remaining = len(flowables)
+        receipt_frame().addFromList(flowables, pdf_canvas)
+        pdf_canvas.showPage()
+        if len(flowables) == remaining:
+            raise LayoutError(f"Bill #{bill['id']} does not fit on a receipt page")
+
+def stream_bills_pdf(bills):
+    # Bills are drawn one at a time as the generator yields them, but ReportLab's canvas
+    # keeps every finished page until save(), so memory grows with the page count (hence
+    # BILL_EXPORT_PDF_MAX_ORDERS). A PDF's cross-reference table is written last, so
+    # nothing is sent until the whole document has been built in a temporary file.
+    with tempfile.TemporaryFile() as f:
+        pdf_canvas = Canvas(f, pagesize=RECEIPT_PAGE_SIZE)
+        for bill in bills:
+            # Layout runs in the thread pool; the bill query stays on this green thread
+            tpool.execute(draw_bill_pages, pdf_canvas, bill)
+        tpool.execute(pdf_canvas.save)
+        f.seek(0)
+        for chunk in iter(lambda: f.read(65536), b''):
+            yield chunk
+
+def prerender_bill(order_id):
+    """Background task: renders a freshly placed order's bill into the cache."""
+    with app.app_context():
+        order = db.session.get(Order, order_id)
+        if order:
+            bill_cache.get_or_render(order.id, lambda: bill_data(order))
+
+@order_placed.connect
+def prerender_bill_on_order_placed(sender, order_id):
+    socketio.start_background_task(prerender_bill, order_id)
+
+# --- Print spooler ---
+SPOOL_EXTENSIONS = {'pdf': 'pdf', 'escpos': 'bin', 'text': 'txt'}
+
+class PrintSpooler:
+    """Prints receipts for new orders in the background, one at a time in order of placement.
+
+    A single green thread drains a FIFO queue, so receipts reach the target in the
+    order they were queued. Failed writes are retried with exponential backoff; a
+    receipt that still fails is logged and skipped so the kitchen queue keeps moving.
+    """
+
+    def __init__(self, target, bill_format, retries, retry_delay):
+        self.kind, _, self.location = target.partition(':')
+        if self.kind not in ('dir', 'pipe', 'unix', 'tcp') or not self.location:
+            raise ValueError(f"Unsupported print spool target: {target!r}")
+        if bill_format not in SPOOL_EXTENSIONS:
+            raise ValueError(f"Unsupported print spool format: {bill_format!r}")
+        self.bill_format = bill_format
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = Queue()
+        self._worker = None
+
+    def submit(self, order_id):
+        self.queue.put(order_id)
+        if self._worker is None:
+            self._worker = socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            order_id = self.queue.get()
+            try:
+                data = self._render(order_id)
+            except Exception:
+                app.logger.exception("Could not render receipt for order #%s", order_id)
+                continue
+            if data is not None:
+                self._deliver(order_id, data)
+
+    def _render(self, order_id):
+        with app.app_context():
+            order = db.session.get(Order, order_id)
+            if order is None:
+                return None
+            if self.bill_format == 'pdf':
+                return bill_cache.get_or_render(order.id, lambda: bill_data(order))
+            if self.bill_format == 'text':
+                return render_bill_text(bill_data(order)).encode()
+            return render_bill_escpos(bill_data(order))
+
+    def _deliver(self, order_id, data):
+        for attempt in range(self.retries + 1):
+            try:
+                # Pipes and sockets block, so the write runs in the thread pool
+                tpool.execute(self._write, order_id, data)
+                return
+            except OSError as e:
+                app.logger.warning("Print spool write for order #%s failed (attempt %d): %s", order_id, attempt + 1, e)
+                if attempt < self.retries:
+                    socketio.sleep(self.retry_delay * 2 ** attempt)
+        app.logger.error("Giving up on printing receipt for order #%s", order_id)
+
+    def _write(self, order_id, data):
+        if self.kind == 'dir':
+            os.makedirs(self.location, exist_ok=True)
+            # Zero-padded ids keep the directory listing in order of placement
+            path = os.path.join(self.location, f"order_{order_id:08d}.{SPOOL_EXTENSIONS[self.bill_format]}")
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+        elif self.kind == 'pipe':
+            with open(self.location, 'wb') as f:
+                f.write(data)
+        else:
+            if self.kind == 'unix':
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                address = self.location
+            else:
+                host, port = self.location.rsplit(':', 1)
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                address = (host, int(port))
+            with sock:
+                sock.settimeout(10)
+                sock.connect(address)
+                sock.sendall(data)
+
+print_spooler = None
+if app.config['PRINT_SPOOL_TARGET']:
+    print_spooler = PrintSpooler(app.config['PRINT_SPOOL_TARGET'], app.config['PRINT_SPOOL_FORMAT'],
+                                 app.config['PRINT_SPOOL_RETRIES'], app.config['PRINT_SPOOL_RETRY_DELAY'])
+
+    @order_placed.connect
+    def spool_receipt_on_order_placed(sender, order_id):
+        print_spooler.submit(order_id)
+
+# ==============================================================================
+# Аналитика (Analytics)
+# ==============================================================================
+
+ROLLUP_NAME = 'sales'
+ROLLUP_BATCH_SIZE = 500
+
+def add_to_rollup(model, key, **amounts):
+    row = db.session.get(model, key)
+    if row is None:
+        row = model(**dict(zip([column.name for column in model.__table__.primary_key], key)),
+                    **{name: 0 for name in amounts})
+        db.session.add(row)
+    for name, amount in amounts.items():
+        setattr(row, name, getattr(row, name) + amount)
+
+def rollup_totals(bills):
+    """Sums bill data into (daily, hourly, by_food) totals keyed like the rollup tables."""
+    daily, hourly, by_food = {}, {}, {}
+    for bill in bills:
+        day = bill['timestamp'].date()
+        hour = bill['timestamp'].replace(minute=0, second=0, microsecond=0)
+        quantity = sum(item['quantity'] for item in bill['items'])
+        for bucket, key in ((daily, (day,)), (hourly, (hour,))):
+            totals = bucket.setdefault(key, [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += quantity
+            totals[2] += bill['total_bill']
+        for item in bill['items']:
+            totals = by_food.setdefault((day, item['food_name']), [0, 0.0])
+            totals[0] += item['quantity']
+            totals[1] += item['price'] * item['quantity']
+    return daily, hourly, by_food
+
+def add_rollup_totals(totals):
+    daily, hourly, by_food = totals
+    for key, (count, quantity, revenue) in daily.items():
+        add_to_rollup(SalesDaily, key, order_count=count, quantity=quantity, revenue=revenue)
+    for key, (count, quantity, revenue) in hourly.items():
+        add_to_rollup(SalesHourly, key, order_count=count, quantity=quantity, revenue=revenue)
+    for key, (quantity, revenue) in by_food.items():
+        add_to_rollup(SalesByFood, key, quantity=quantity, revenue=revenue)
+
+def compact_rollups(settle_seconds=None):
+    """Folds orders placed since the last run into the rollup tables. Returns the number of orders added.
+
+    Progress is tracked by a last-order-id watermark that is advanced with a
+    compare-and-set, so concurrent runs in different workers never count an order twice.
+    The watermark must never pass an id that is still to be committed. With the order queue,
+    that is known exactly: it stops below the oldest queued order, however far the writers lag.
+    Without it, orders are committed by the request that placed them, and waiting
+    `settle_seconds` covers those commits.
+    """
+    if settle_seconds is None:
+        settle_seconds = app.config['ROLLUP_SETTLE_SECONDS']
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    added = 0
+    while True:
+        state = db.session.get(RollupState, ROLLUP_NAME)
+        if state is None:
+            db.session.add(RollupState(name=ROLLUP_NAME, last_order_id=0))
+            db.session.commit()
+            continue
+        watermark = state.last_order_id
+        query = Order.query.options(selectinload(Order.items)).filter(Order.id > watermark)
+        if order_queue is not None:
+            # Read before the orders, so no id below the bound can be committed after the query
+            query = query.filter(Order.id < order_queue.min_unwritten_id())
+        orders = query.order_by(Order.id).limit(ROLLUP_BATCH_SIZE).all()
+        settled = orders
+        if order_queue is None:
+            # Stop at the first unsettled order so later ids wait for it
+            settled = []
+            for order in orders:
+                if order.timestamp > cutoff:
+                    break
+                settled.append(order)
+        if not settled:
+            db.session.rollback()
+            return added
+
+        add_rollup_totals(rollup_totals(bill_data(order) for order in settled))
+
+        moved = db.session.execute(
+            RollupState.__table__.update()
+            .where(RollupState.name == ROLLUP_NAME, RollupState.last_order_id == watermark)
+            .values(last_order_id=settled[-1].id))
+        if moved.rowcount != 1:
+            # Another worker got there first; drop our totals and start over from its watermark
+            db.session.rollback()
+            continue
+        db.session.commit()
+        added += len(settled)
+
+def rebuild_rollups():
+    """Recomputes all rollups from the raw order history, archived orders included."""
+    for model in (SalesDaily, SalesHourly, SalesByFood, RollupState):
+        db.session.query(model).delete()
+    archived = 0
+    for bills in (order_archive.iter_partitions() if order_archive is not None else ()):
+        add_rollup_totals(rollup_totals(bills))
+        archived += len(bills)
+    db.session.commit()
+    return archived + compact_rollups(settle_seconds=0)
+
+_rollup_compaction_scheduled = False
+
+def compact_rollups_later():
+    """Background task: waits for new orders to settle, then folds them into the rollups."""
+    global _rollup_compaction_scheduled
+    socketio.sleep(app.config['ROLLUP_SETTLE_SECONDS'] + 1)
+    _rollup_compaction_scheduled = False
+    with app.app_context():
+        try:
+            compact_rollups()
+        except Exception:
+            app.logger.exception("Sales rollup compaction failed")
+
+@order_placed.connect
+def schedule_rollup_compaction(sender, order_id):
+    global _rollup_compaction_scheduled
+    if not _rollup_compaction_scheduled:
+        _rollup_compaction_scheduled = True
+        socketio.start_background_task(compact_rollups_later)
+
+def sales_summary(days):
+    """Reads KPIs for the last `days` days from the rollup tables only."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    daily = SalesDaily.query.filter(SalesDaily.day >= since).order_by(SalesDaily.day.desc()).all()
+    hourly = (SalesHourly.query.filter(SalesHourly.hour >= datetime.utcnow() - timedelta(hours=24))
+              .order_by(SalesHourly.hour).all())
+    top_foods = (db.session.query(SalesByFood.food_name, db.func.sum(SalesByFood.quantity),
+                                  db.func.sum(SalesByFood.revenue))
+                 .filter(SalesByFood.day >= since).group_by(SalesByFood.food_name)
+                 .order_by(db.func.sum(SalesByFood.revenue).desc()).limit(20).all())
+    return {
+        'days': days,
+        'totals': {
+            'order_count': sum(row.order_count for row in daily),
+            'quantity': sum(row.quantity for row in daily),
+            'revenue': sum(row.revenue for row in daily),
+        },
+        'daily': [{'day': row.day.isoformat(), 'order_count': row.order_count,
+                   'quantity': row.quantity, 'revenue': row.revenue} for row in daily],
+        'hourly': [{'hour': row.hour.isoformat(), 'order_count': row.order_count,
+                    'quantity': row.quantity, 'revenue': row.revenue} for row in hourly],
+        'top_foods': [{'food_name': name, 'quantity': int(quantity or 0), 'revenue': float(revenue or 0)}
+                      for name, quantity, revenue in top_foods],
+    }
+
+# ==============================================================================
+# Архив заказов (Order Archive)
+# ==============================================================================
+
+def bill_to_json(bill):
+    return dict(bill, timestamp=bill['timestamp'].isoformat())
+
+def bill_from_json(record):
+    return dict(record, timestamp=datetime.fromisoformat(record['timestamp']))
+
+class OrderArchive:
+    """Cold storage for old orders: gzip JSON-lines files, one per day, plus a SQLite index.
+
+    Files live at <directory>/<YYYY>/<MM>/<YYYY-MM-DD>.jsonl.gz and are only ever appended
+    to (as new gzip members). The index maps order ids to their day and records the
+    customer phone, so lookups and searches read a single small file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = open_local_sqlite(os.path.join(self.directory, 'index.db'), synchronous='FULL')
+            conn.execute("CREATE TABLE IF NOT EXISTS archived_order ("
+                         "order_id INTEGER PRIMARY KEY, day TEXT NOT NULL, customer_phone TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_archived_order_phone ON archived_order (customer_phone)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_archived_order_day ON archived_order (day)")
+            self._conn = conn
+        return self._conn
+
+    def _partition_path(self, day):
+        return os.path.join(self.directory, day[:4], day[5:7], f"{day}.jsonl.gz")
+
+    def _read_partition(self, day):
+        path = self._partition_path(day)
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [bill_from_json(json.loads(line)) for line in f if line.strip()]
+
+    def archived_ids(self, order_ids):
+        conn = self._connection()
+        placeholders = ','.join('?' * len(order_ids))
+        return {row[0] for row in conn.execute(
+            f"SELECT order_id FROM archived_order WHERE order_id IN ({placeholders})", list(order_ids))}
+
+    def append(self, bills):
+        """Durably writes bills to their day partitions, then indexes them."""
+        by_day = {}
+        for bill in bills:
+            by_day.setdefault(bill['timestamp'].date().isoformat(), []).append(bill)
+        for day, day_bills in by_day.items():
+            path = self._partition_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    for bill in day_bills:
+                        f.write((json.dumps(bill_to_json(bill)) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+        self._connection().executemany(
+            "INSERT OR IGNORE INTO archived_order (order_id, day, customer_phone) VALUES (?, ?, ?)",
+            [(bill['id'], bill['timestamp'].date().isoformat(), bill.get('customer_phone')) for bill in bills])
+
+    def find(self, order_id):
+        row = self._connection().execute("SELECT day FROM archived_order WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        for bill in self._read_partition(row[0]):
+            if bill['id'] == order_id:
+                return bill
+        return None
+
+    def search(self, text=None, start=None, end=None, limit=50):
+        """Finds archived orders by order id or customer phone and/or day range (newest first)."""
+        clauses, params = [], []
+        if text and text.isdigit():
+            clauses.append("(order_id = ? OR customer_phone = ?)")
+            params += [int(text), text]
+        elif text:
+            clauses.append("customer_phone = ?")
+            params.append(text)
+        if start:
+            clauses.append("day >= ?")
+            params.append(start.isoformat())
+        if end:
+            clauses.append("day <= ?")
+            params.append(end.isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT order_id, day FROM archived_order {where} ORDER BY order_id DESC LIMIT ?", params + [limit]).fetchall()
+        wanted_by_day = {}
+        for archived_id, day in rows:
+            wanted_by_day.setdefault(day, set()).add(archived_id)
+        found = {}
+        for day, ids in wanted_by_day.items():
+            for bill in self._read_partition(day):
+                if bill['id'] in ids:
+                    found[bill['id']] = bill  # Last copy wins if a partition has duplicates
+        return [found[archived_id] for archived_id, _ in rows if archived_id in found]
+
+    def iter_partitions(self):
+        """Yields the de-duplicated bills of each day partition, oldest day first."""
+        days = [row[0] for row in self._connection().execute("SELECT DISTINCT day FROM archived_order ORDER BY day")]
+        for day in days:
+            yield list({bill['id']: bill for bill in self._read_partition(day)}.values())
+
+order_archive = OrderArchive(app.config['ARCHIVE_DIR']) if app.config['ARCHIVE_DIR'] else None
+
+class ArchiveNotConfigured(Exception):
+    """Raised when archiving is attempted without an explicit ARCHIVE_DIR."""
+
+def archived_order_view(bill):
+    """Wraps archived bill data so templates can use it like an Order (order.items, item.food_name)."""
+    return SimpleNamespace(**dict(bill, items=[SimpleNamespace(**item) for item in bill['items']]))
+
+def archive_orders(older_than_days, batch_size=500):
+    """Moves orders older than the cutoff from the database into the archive. Returns the count.
+
+    Only orders already folded into the sales rollups are moved, so analytics keep them.
+    Each batch is written and indexed before it is deleted, and orders already in the
+    index are not written again, so an interrupted run can simply be repeated.
+    The newest order is never moved: on SQLite its id would be handed out again.
+    Raises ArchiveNotConfigured unless ARCHIVE_DIR is set.
+    """
+    if order_archive is None:
+        raise ArchiveNotConfigured("ARCHIVE_DIR is not set. Archived orders are deleted from the database, "
+                                   "so point it at persistent storage before archiving.")
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    compact_rollups()
+    state = db.session.get(RollupState, ROLLUP_NAME)
+    rolled_up_to = state.last_order_id if state else 0
+    max_id = db.session.query(db.func.max(Order.id)).scalar() or 0
+    moved = 0
+    while True:
+        orders = (Order.query.options(selectinload(Order.items))
+                  .filter(Order.timestamp < cutoff, Order.id <= rolled_up_to, Order.id < max_id)
+                  .order_by(Order.id).limit(batch_size).all())
+        if not orders:
+            return moved
+        already_archived = order_archive.archived_ids([order.id for order in orders])
+        order_archive.append([bill_data(order) for order in orders if order.id not in already_archived])
+        for order in orders:
+            db.session.delete(order)
+        db.session.commit()
+        for order in orders:
+            bill_cache.discard(order.id)
+        moved += len(orders)
 
 # ==============================================================================
 # Запуск приложения (Application Runner)
 # ==============================================================================
 
+# --- Schema migrations ---
+# Versioned, append-only list of (version, description, statements). Statements are SQL
+# strings or callables run inside the migration's transaction. They must
+# run on both SQLite and PostgreSQL and be safe on databases created by create_all(),
+# which already has everything the models declare.
+MIGRATIONS = [
+    (1, "Index orders by (timestamp, id) for admin listings",
+     ['CREATE INDEX IF NOT EXISTS ix_order_timestamp_id ON "order" (timestamp, id)']),
+    (2, "Index order items by order_id",
+     ['CREATE INDEX IF NOT EXISTS ix_order_item_order_id ON order_item (order_id)']),
+    (3, "Index orders by customer_phone",
+     ['CREATE INDEX IF NOT EXISTS ix_order_customer_phone ON "order" (customer_phone)']),
+    (4, "Create sales rollup tables",
+     [lambda: create_tables(SalesDaily, SalesHourly, SalesByFood, RollupState)]),
+]
+
+def create_tables(*models):
+    for model in models:
+        model.__table__.create(db.session.connection(), checkfirst=True)
+
+def run_migrations():
+    """Applies pending migrations in order, each in its own transaction. Returns the versions applied."""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    newly_applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement()
+                else:
+                    db.session.execute(text(statement))
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+        newly_applied.append(version)
+    return newly_applied
+
 def setup_database(app):
     with app.app_context():
         # Create upload folder if it doesn't exist
         if not os.path.exists(UPLOAD_FOLDER):
             os.makedirs(UPLOAD_FOLDER)
         db.create_all()
+        run_migrations()
         # Remove the initial food items seeding
         # Admin can add food items through the admin panel
         print("Database initialized. No initial food items added.")
@@ -990,6 +3595,8 @@ if __name__ == '__main__':
     # This will create the database and tables if they don't exist
     # before the server starts.
     setup_database(app)
+    if order_queue is not None:
+        order_queue.start()
     print("Starting FOODIFY server... Access it at http://127.0.0.1:5000 or your local IP.")
     socketio.run(app, host="0.0.0.0", port=5000)
 
@@ -999,3 +3606,52 @@ def init_db_command():
     setup_database(app)
     print("Database initialized.")
 
+@app.cli.command("migrate-db")
+def migrate_db_command():
+    """Applies pending schema migrations."""
+    with app.app_context():
+        if not run_migrations():
+            print("Database schema is up to date.")
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recomputes the sales rollup tables from the full order history."""
+    with app.app_context():
+        count = rebuild_rollups()
+    print(f"Rebuilt sales rollups from {count} orders.")
+
+@app.cli.command("archive-orders")
+@click.option("--days", default=None, type=int, help="Archive orders older than this many days.")
+def archive_orders_command(days):
+    """Moves old orders out of the database into compressed daily archive files."""
+    with app.app_context():
+        try:
+            count = archive_orders(days if days is not None else app.config['ARCHIVE_AFTER_DAYS'])
+        except ArchiveNotConfigured as e:
+            raise click.ClickException(str(e))
+    print(f"Archived {count} orders.")
+
+@app.cli.command("gc-uploads")
+@click.option("--grace-hours", default=1.0, help="Keep unreferenced files younger than this.")
+def gc_uploads_command(grace_hours):
+    """Deletes uploaded files no longer referenced by any food or setting."""
+    with app.app_context():
+        removed = collect_orphan_uploads(grace_seconds=grace_hours * 3600)
+    print(f"Removed {removed} unreferenced upload files.")
+
+@app.cli.command("bench-bills")
+@click.option("--items", default=5, help="Line items on the sample bill.")
+@click.option("--repeat", default=200, help="Renders per format.")
+def bench_bills_command(items, repeat):
+    """Compares receipt rendering cost of the PDF, ESC/POS and text formats."""
+    bill = {
+        'id': 1, 'timestamp': datetime.now(), 'customer_name': 'Benchmark Customer',
+        'total_bill': DELIVERY_CHARGE + sum(50.0 * (i + 1) for i in range(items)),
+        'items': [{'food_name': f'Sample Dish {i + 1}', 'quantity': i + 1, 'price': 50.0} for i in range(items)],
+    }
+    for name, renderer in (('pdf', render_bill_pdf), ('escpos', render_bill_escpos), ('text', render_bill_text)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            output = renderer(bill)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        print(f"{name:>7}: {elapsed_ms:8.3f} ms/render, {len(output):6d} bytes")
@@ -0,0 +1,55 @@
+"""Shared fixtures: imports the app against throwaway files.
+
+The app reads its configuration from the environment at import time, so the
+database and the host-local stores are pointed at a temporary directory before
+the first import. Set TEST_POSTGRES_URL to run everything against PostgreSQL
+instead of a temporary SQLite file.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+TMP_DIR = tempfile.mkdtemp(prefix='foodify-tests-')
+
+os.environ['DATABASE_URL'] = (os.environ.get('TEST_POSTGRES_URL')
+                              or 'sqlite:///' + os.path.join(TMP_DIR, 'foodify.db'))
+os.environ['IDEMPOTENCY_STORE_PATH'] = os.path.join(TMP_DIR, 'idempotency.db')
+os.environ['SESSION_STORE_PATH'] = os.path.join(TMP_DIR, 'sessions.db')
+os.environ['BILL_CACHE_DIR'] = os.path.join(TMP_DIR, 'bills')
+os.environ.pop('ORDER_QUEUE_PATH', None)
+os.environ.pop('PRINT_SPOOL_TARGET', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def foodify():
+    import app
+    with app.app.app_context():
+        app.db.create_all()
+        app.run_migrations()
+    return app
+
+
+@pytest.fixture
+def client(foodify):
+    yield foodify.app.test_client()
+    with foodify.app.app_context():
+        foodify.db.session.query(foodify.OrderItem).delete()
+        foodify.db.session.query(foodify.Order).delete()
+        foodify.db.session.query(foodify.Food).delete()
+        foodify.db.session.commit()
+    foodify.menu_cache.invalidate()
+
+
+@pytest.fixture
+def food(foodify, client):
+    with foodify.app.app_context():
+        item = foodify.Food(name='Veg Thali', price=120.0, image_url='')
+        foodify.db.session.add(item)
+        foodify.db.session.commit()
+        food_id = item.id
+    foodify.menu_cache.invalidate()
+    return food_id
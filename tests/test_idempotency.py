@@ -0,0 +1,48 @@
+"""Checkout idempotency: a resubmitted form must not create a second order."""
+
+
+def checkout(client, key):
+    return client.post('/place_order', data={
+        'customer_name': 'Asha', 'customer_phone': '9800000000',
+        'customer_address': 'Station Road', 'landmark': 'Temple', 'pincode': '743425',
+        'idempotency_key': key,
+    })
+
+
+def fill_cart(client, food_id):
+    with client.session_transaction() as sess:
+        sess['cart'] = {str(food_id): 2}
+
+
+def order_count(foodify):
+    with foodify.app.app_context():
+        return foodify.Order.query.count()
+
+
+def test_duplicate_submit_returns_the_same_order(foodify, client, food):
+    fill_cart(client, food)
+    first = checkout(client, 'key-duplicate')
+    second = checkout(client, 'key-duplicate')
+
+    assert first.status_code == 302
+    assert '/order/success/' in first.location
+    assert second.location == first.location
+    assert order_count(foodify) == 1
+
+
+def test_failed_order_releases_its_key(foodify, client, food, monkeypatch):
+    def broken_insert(order_fields, item_rows):
+        raise RuntimeError("database unavailable")
+
+    fill_cart(client, food)
+    with monkeypatch.context() as patch:
+        patch.setattr(foodify, 'insert_order', broken_insert)
+        failed = checkout(client, 'key-retry')
+    assert failed.status_code == 500
+    assert foodify.idempotency_store.reserve('key-retry') == (True, None)
+    foodify.idempotency_store.release('key-retry')
+
+    # The cart survives the failure, so the same form can be submitted again
+    retried = checkout(client, 'key-retry')
+    assert '/order/success/' in retried.location
+    assert order_count(foodify) == 1
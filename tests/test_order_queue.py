@@ -0,0 +1,58 @@
+"""Order ingestion queue: replays after a crash and conflicting order ids."""
+import os
+
+import pytest
+
+ORDER = {'customer_name': 'Asha', 'customer_phone': '9800000000',
+         'customer_address': 'Station Road, Landmark: Temple, PIN: 743425', 'total_bill': 260.0}
+ITEMS = [{'food_name': 'Veg Thali', 'quantity': 2, 'price': 120.0}]
+
+
+@pytest.fixture
+def queue(foodify, client, tmp_path):
+    order_queue = foodify.OrderIngestQueue(os.path.join(tmp_path, 'queue.db'), max_depth=10,
+                                           wait_seconds=1, batch_size=10, poll_ms=10)
+    order_queue._worker = object()  # The tests drive the writer themselves
+    with foodify.app.app_context():
+        yield order_queue
+
+
+def pending_ids(queue):
+    return [row[0] for row in queue._connection().execute("SELECT id FROM pending_order")]
+
+
+def test_replayed_row_is_dequeued(foodify, queue):
+    order_id = queue.enqueue(ORDER, ITEMS)
+    rows = queue._claim()
+    queue._write(rows)
+    assert pending_ids(queue) == []
+
+    # A writer that died after committing but before dequeuing leaves the row behind
+    queue._connection().execute("INSERT INTO pending_order (id, payload, created_at) VALUES (?, ?, 0)", rows[0])
+    queue._write(queue._claim())
+
+    assert pending_ids(queue) == []
+    assert not queue.is_failed(order_id)
+    assert foodify.Order.query.count() == 1
+    assert foodify.db.session.get(foodify.Order, order_id).customer_name == 'Asha'
+
+
+def test_conflicting_row_is_dead_lettered(foodify, queue, client, monkeypatch):
+    order_id = queue.enqueue(ORDER, ITEMS)
+    # Another host already saved a different order under the same id
+    foodify.db.session.add(foodify.Order(id=order_id, customer_name='Someone else', customer_phone='1',
+                                         customer_address='Elsewhere', total_bill=10.0))
+    foodify.db.session.commit()
+
+    queue._write(queue._claim())
+
+    assert pending_ids(queue) == []
+    assert queue.is_failed(order_id)
+    [failed] = queue.failed_orders()
+    assert (failed.id, failed.customer_name) == (order_id, 'Asha')
+    assert foodify.db.session.get(foodify.Order, order_id).customer_name == 'Someone else'
+
+    monkeypatch.setattr(foodify, 'order_queue', queue)
+    page = client.get(f'/order/success/{order_id}')
+    assert b'Needs Attention' in page.data
+    assert b'Someone else' not in page.data
@@ -0,0 +1,52 @@
+"""Server-side sessions: the cookie holds only an id, rotated on login."""
+import pytest
+
+
+@pytest.fixture
+def store(foodify):
+    return foodify.app.session_interface.store
+
+
+def session_id(client, foodify):
+    cookie = client.get_cookie(foodify.app.config['SESSION_COOKIE_NAME'])
+    return cookie.value if cookie else None
+
+
+def test_cart_is_saved_under_an_opaque_id(foodify, client, food, store):
+    response = client.post(f'/cart/add/{food}', data={'quantity': 2})
+
+    sid = session_id(client, foodify)
+    blob, _ = store.get(sid)
+    assert foodify.decode_session(blob) == {'cart': {str(food): 2}}
+    # Not permanent, so the cookie lasts for the browser session only
+    assert 'Expires' not in response.headers['Set-Cookie']
+
+
+def test_login_rotates_the_session_id(foodify, client, food, store):
+    client.post(f'/cart/add/{food}')
+    before = session_id(client, foodify)
+
+    client.post('/admin', data={'username': foodify.ADMIN_USERNAME, 'password': foodify.ADMIN_PASSWORD})
+
+    after = session_id(client, foodify)
+    assert after != before
+    assert store.get(before) is None
+    data = foodify.decode_session(store.get(after)[0])
+    assert data == {'cart': {str(food): 1}, 'admin_logged_in': True}
+
+
+def test_emptied_session_is_deleted(foodify, client, food, store):
+    client.post(f'/cart/add/{food}')
+    sid = session_id(client, foodify)
+
+    client.get('/cart/clear')
+
+    assert store.get(sid) is None
+    assert session_id(client, foodify) is None
+
+
+def test_empty_session_sets_no_cookie(client):
+    response = client.get('/api/cart')
+
+    assert response.status_code == 200
+    assert 'Set-Cookie' not in response.headers